@@ -1,16 +1,29 @@
 #!/usr/bin/env python3
 
+import os
 import sys
-import json
+import time
 import argparse
+import cProfile
+import functools
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from utils.config import load_config, iter_srams, ConfigError
 from utils.class_process import Process
 from utils.class_memory import Memory
+from utils.class_memory import cacti_inputs, corner_cacti_inputs, results_dir_for
+from utils.cacti_cache import CactiCache, cacti_binary_id
+from utils.async_engine import generate_srams_async
+from utils.cacti_surrogate import CactiSurrogate, SurrogateError
 
-from utils.generate_lib import generate_lib
-from utils.generate_lef import generate_lef
+from utils.generate_lib import generate_lib, render_lib, MergedLib
+from utils.generate_lef import generate_lef, read_lef_macro, MergedLef
 from utils.generate_verilog import generate_verilog
 from utils.generate_verilog import generate_verilog_bb
+from utils.verify_views import verify_views, verify_merged_lib, verify_merged_lef
+from utils.timings import Timings
+from utils.manifest import generator_version, fingerprint, up_to_date, write_manifest
 
 ################################################################################
 # RUN GENERATOR
@@ -43,29 +56,291 @@ def get_args() -> argparse.Namespace:
         "--cacti_dir", action="store", help="CACTI installation directory ", required=False, default=None
     )
 
+    parser.add_argument(
+        "-j", "--jobs", action="store", type=int, help="Number of SRAMs to generate in parallel (0 = one per CPU) ", required=False, default=1
+    )
+
+    parser.add_argument(
+        "--async", action="store_true", dest="use_async", help="Run CACTI from a single process with asyncio, --jobs limits the CACTI runs in flight ", required=False, default=False
+    )
+
+    parser.add_argument(
+        "--estimate", action="store_true", help="Estimate CACTI results with a surrogate model fit to the CACTI cache instead of running CACTI ", required=False, default=False
+    )
+
+    parser.add_argument(
+        "--verify", action="store_true", help="Check the generated views for structural problems (pin names, bus widths, references, pin shapes) ", required=False, default=False
+    )
+
+    parser.add_argument(
+        "--merged-lib", action="store", metavar="NAME", help="Also write the cells of all SRAMs into one Liberty library NAME.lib in the output directory ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "--merged-lef", action="store", metavar="NAME", help="Also write the macros of all SRAMs into one LEF library NAME.lef in the output directory ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "--profile", action="store", metavar="PATH", help="Write the wall time of every stage of every SRAM (and the totals) to PATH as JSON lines ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "--cprofile", action="store", metavar="PATH", help="Run under cProfile and dump the statistics of the main process to PATH ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "--force", action="store_true", help="Regenerate every SRAM, even those whose inputs did not change since the last run ", required=False, default=False
+    )
+
+    parser.add_argument(
+        "--cache-dir", action="store", help="Directory for the persistent CACTI result cache ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "--cache-size-mb", action="store", type=float, help="Size limit of the CACTI result cache in MB ", required=False, default=64
+    )
+
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always run CACTI, do not read or write the result cache ", required=False, default=False
+    )
+
+    parser.add_argument(
+        "--clear-cache-failures", action="store_true", help="Forget the CACTI configurations cached as failing before running ", required=False, default=False
+    )
+
     return parser.parse_args()
 
 
+# generate_sram: build the memory (runs cacti unless an sram with the same cacti
+# inputs is already in cacti_memo) and write out all views for a single sram.
+# With verify the views are checked afterwards and any problem fails the sram.
+# Returns the name of the sram and, with merged_lib, its cell rendered for the
+# library of that name (see MergedLib). If fingerprints (sram
+# name -> fingerprint of its inputs) is given, a manifest of the views is
+# written for the next run. Every stage is recorded in timings. cacti_jobs is
+# the number of cacti processes the sram may run at once (its corners and retry
+# substitutes).
+def generate_sram ( process, sram_data, output_dir, cacti_dir, cacti_cache, cacti_memo, verify = False, merged_lib = None, fingerprints = None, timings = None, cacti_jobs = 1 ):
+  timings = timings if timings else Timings()
+  name = str(sram_data['name'])
+  with timings.stage(name, 'sram'):
+    with timings.stage(name, 'memory'):
+      memory = Memory(process, sram_data, output_dir, cacti_dir, cacti_cache, cacti_memo, timings, cacti_jobs)
+    with timings.stage(name, 'lib'):
+      paths = generate_lib(memory)
+    with timings.stage(name, 'lef'):
+      paths.append(generate_lef(memory))
+    with timings.stage(name, 'verilog'):
+      paths.append(generate_verilog(memory))
+    with timings.stage(name, 'verilog_bb'):
+      paths.append(generate_verilog_bb(memory))
+    if verify:
+      with timings.stage(name, 'verify'):
+        problems = verify_views(memory)
+      if problems:
+        raise Exception(f'{len(problems)} problems in the views of {memory.name}:\n  ' + '\n  '.join(problems))
+      print(f'Verified views of {memory.name}')
+    cell = render_lib(memory, merged_lib) if merged_lib else None
+    if fingerprints:
+      with timings.stage(name, 'manifest'):
+        extra = { 'verified' : bool(verify) }
+        if cell:
+          extra.update({ 'merged_lib' : merged_lib, 'merged_cell' : cell[1] })
+        write_manifest(memory.results_dir, fingerprints[memory.name], paths, extra)
+  return memory.name, cell
+
+# generate_srams: generate a list of srams, sharing cacti runs between srams
+# with identical cacti inputs (cacti_memo may come pre-filled). Returns a dict
+# of sram name to traceback text for every sram that failed, and what
+# generate_sram returned for every sram that succeeded. Kept at module level so
+# it can be shipped to pool workers.
+def generate_srams ( process, srams, output_dir, cacti_dir, cacti_cache, cacti_memo = None, verify = False, merged_lib = None, fingerprints = None, timings = None, cacti_jobs = 1 ):
+  cacti_memo = dict(cacti_memo) if cacti_memo else {}
+  failed = {}
+  results = []
+  for sram_data in srams:
+    try:
+      results.append(generate_sram(process, sram_data, output_dir, cacti_dir, cacti_cache, cacti_memo, verify, merged_lib, fingerprints, timings, cacti_jobs))
+    except Exception:
+      failed[str(sram_data['name'])] = traceback.format_exc()
+  return failed, results
+
+
 def main ( args : argparse.Namespace):
 
-  # Load the JSON configuration file
-  with open(args.config, 'r') as fid:
-    raw = [line.strip() for line in fid if not line.strip().startswith('#')]
-  json_data = json.loads('\n'.join(raw))
+  # Time every stage of the run when profiling
+  run_start = time.perf_counter()
+  timings = Timings(args.profile)
+  timings.start()
+
+  # Load the JSON configuration file, checking all of it before any work starts
+  try:
+    with timings.stage(None, 'load_config'):
+      json_data = load_config(args.config)
+  except ConfigError as e:
+    sys.exit(f'Invalid configuration {e}')
 
   # Create a process object (shared by all srams)
   process = Process(json_data)
 
-  # Go through each sram and generate the lib, lef and v files
-  for sram_data in json_data['srams']:
-    memory = Memory(process, sram_data, args.output_dir, args.cacti_dir)
-    generate_lib(memory)
-    generate_lef(memory)
-    generate_verilog(memory)
-    generate_verilog_bb(memory)
+  # Cacti results are cached across runs unless disabled
+  cacti_cache = None if args.no_cache else CactiCache(args.cache_dir, args.cache_size_mb)
+  if cacti_cache and args.clear_cache_failures:
+    cacti_cache.clear_failures()
+
+  jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+
+  # Skip the srams whose inputs (and outputs) did not change since the last
+  # run, neither cacti nor the views are touched for them
+  cacti_dir = args.cacti_dir if args.cacti_dir else os.environ.get('CACTI_BUILD_DIR')
+  options = { 'estimate'   : args.estimate
+            , 'cacti'      : cacti_binary_id(cacti_dir) if process.tech_nm != 7 and cacti_dir else None }
+  process_data = { k : v for k, v in json_data.items() if k not in ('srams', 'sram_templates') }
+  version = generator_version()
+  fingerprints = {}
+  unchanged = []
+  srams = []
+  names = []
+  for sram_data in iter_srams(json_data):
+    names.append(str(sram_data['name']))
+    with timings.stage(names[-1], 'fingerprint'):
+      fp = fingerprint(process_data, sram_data, version, options)
+      manifest = None if args.force else up_to_date(results_dir_for(args.output_dir, str(sram_data['name'])), fp)
+    # Views written without --verify are not skipped when it is given
+    if manifest and args.verify and not manifest.get('verified'):
+      manifest = None
+    # The cell for the merged library is kept in the manifest, its header is
+    # taken from the merged library of the last run (or the first sram)
+    if manifest and args.merged_lib and (manifest.get('merged_lib') != args.merged_lib
+                                         or (len(names) == 1 and not os.path.exists(results_dir_for(args.output_dir, args.merged_lib + '.lib')))):
+      manifest = None
+    if manifest:
+      unchanged.append((str(sram_data['name']), manifest))
+    else:
+      fingerprints[str(sram_data['name'])] = fp
+      srams.append(sram_data)
+
+  # Group the srams by the inputs cacti sees so each distinct cacti
+  # configuration only runs once per invocation.
+  groups = {}
+  for i, sram_data in enumerate(srams):
+    key = cacti_inputs(process, sram_data)
+    groups.setdefault(key if key is not None else i, []).append(sram_data)
+  print(f'{len(names)} srams, {len(unchanged)} unchanged, {len(groups)} distinct configurations')
+
+  # The cacti inputs of each group, nominal first, then those of the extra
+  # operating corners
+  def group_keys( key ):
+    if not isinstance(key, tuple):
+      return []
+    return list(dict.fromkeys([key] + list(corner_cacti_inputs(process, key).values())))
+
+  # In estimate mode the surrogate provides the results for every cacti input
+  cacti_memo = {}
+  if args.estimate:
+    try:
+      surrogate = CactiSurrogate.from_cache(cacti_cache if cacti_cache else CactiCache(args.cache_dir, args.cache_size_mb), cacti_dir)
+      print(surrogate.report())
+      for key in groups:
+        for k in group_keys(key):
+          cacti_memo[k] = (surrogate.row(k), k)
+    except SurrogateError as e:
+      sys.exit(f'Cannot estimate cacti results: {e}')
+
+  # The part of cacti_memo a group needs
+  def group_memo( key ):
+    return { k : cacti_memo[k] for k in group_keys(key) if k in cacti_memo } or None
+
+  # Cells for the merged library and macros for the merged LEF are collected as
+  # their srams finish (in the order of the configuration file) and written on
+  # close. The macro is read back from the .lef view of the sram.
+  merged_lib = MergedLib(results_dir_for(args.output_dir, args.merged_lib + '.lib'), args.merged_lib
+                         , names) if args.merged_lib else None
+  merged_lef = MergedLef(results_dir_for(args.output_dir, args.merged_lef + '.lef'), names) if args.merged_lef else None
+  def add_results( results ):
+    for name, cell in results:
+      if merged_lib:
+        merged_lib.add(name, cell)
+      if merged_lef:
+        with timings.stage(name, 'merged_lef'):
+          merged_lef.add(name, read_lef_macro(os.sep.join([results_dir_for(args.output_dir, name), name + '.lef'])))
+  add_results([(name, (None, manifest.get('merged_cell'))) for name, manifest in unchanged])
+
+  # Go through each sram and generate the lib, lef and v files. A failing sram
+  # is reported at the end rather than aborting the rest of the run.
+  failed = {}
+  if args.use_async:
+    failed = generate_srams_async(functools.partial(generate_sram, verify=args.verify, merged_lib=args.merged_lib, fingerprints=fingerprints, timings=timings), process, srams, args.output_dir, args.cacti_dir, cacti_cache, jobs, cacti_memo
+                                  , lambda result: add_results([result]), timings)
+  elif jobs == 1:
+    for key, group in groups.items():
+      group_failed, results = generate_srams(process, group, args.output_dir, args.cacti_dir, cacti_cache
+                                           , group_memo(key), args.verify, args.merged_lib, fingerprints, timings)
+      failed.update(group_failed)
+      add_results(results)
+  else:
+    # Workers share the --jobs budget of cacti processes, so with fewer groups
+    # than jobs the corners and retry substitutes of a group run side by side
+    cacti_jobs = max(1, jobs // max(1, min(jobs, len(groups))))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+      # Every worker only gets the fingerprints of its own group
+      futures = {pool.submit(generate_srams, process, group, args.output_dir, args.cacti_dir, cacti_cache
+                             , group_memo(key), args.verify, args.merged_lib
+                             , { str(sram_data['name']) : fingerprints[str(sram_data['name'])] for sram_data in group }
+                             , timings, cacti_jobs) : group
+                 for key, group in groups.items()}
+      for future in as_completed(futures):
+        if future.exception() is not None:
+          for sram_data in futures[future]:
+            failed[str(sram_data['name'])] = ''.join(traceback.format_exception(type(future.exception()), future.exception(), future.exception().__traceback__))
+        else:
+          group_failed, results = future.result()
+          failed.update(group_failed)
+          add_results(results)
+  if merged_lib:
+    merged_lib.close()
+    print(f'Wrote {merged_lib.count} cells to {merged_lib.path}')
+  if merged_lef:
+    merged_lef.close()
+    print(f'Wrote {merged_lef.count} macros to {merged_lef.path}')
+
+  # With verify the merged files are checked against the views of their srams
+  merged_problems = []
+  if args.verify:
+    done = [ name for name in names if name not in failed ]
+    views = lambda suffix: [ os.sep.join([results_dir_for(args.output_dir, name), name + suffix]) for name in done ]
+    if merged_lib and merged_lib.count and os.path.exists(merged_lib.path):
+      merged_problems += [ f'{merged_lib.path}: {p}' for p in verify_merged_lib(merged_lib.path, views('.lib')) ]
+    if merged_lef and merged_lef.count and os.path.exists(merged_lef.path):
+      merged_problems += [ f'{merged_lef.path}: {p}' for p in verify_merged_lef(merged_lef.path, views('.lef')) ]
+
+  timings.summarize(srams=len(names), unchanged=len(unchanged), failed=len(failed), jobs=jobs, use_async=args.use_async
+                    , wall_ms=round(1000 * (time.perf_counter() - run_start), 3))
+  if args.profile:
+    print(f'Wrote the profile of the run to {args.profile}')
+
+  if failed:
+    print('\n\n\n*********************ERROR******************************\n\n\n')
+    for name, tb in failed.items():
+      print(f'{name} failed:')
+      print(tb)
+    print(f'{len(failed)} of {len(names)} srams failed: {", ".join(failed)}')
+  if merged_problems:
+    print('\n'.join(merged_problems))
+    print(f'{len(merged_problems)} problems found in the merged files')
+  if failed or merged_problems:
+    sys.exit(1)
 
 ### Entry point
 if __name__ == '__main__':
   args = get_args()
-  main( args )
+  if args.cprofile:
+    # Profile the main process (pool workers are not included)
+    profiler = cProfile.Profile()
+    try:
+      profiler.runcall( main, args )
+    finally:
+      profiler.dump_stats( args.cprofile )
+  else:
+    main( args )
 
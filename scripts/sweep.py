@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import argparse
+import itertools
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.config import load_config, ConfigError
+from utils.class_process import Process
+from utils.class_memory import cacti_inputs, retry_strategy
+from utils.cacti_cache import CactiCache
+from utils.cacti_runner import CactiRunner, CactiError
+from utils.cacti_surrogate import CactiSurrogate, SurrogateError
+from utils.area import get_macro_dimensions_batch
+
+################################################################################
+# DESIGN SPACE SWEEP
+#
+# Evaluate every combination of word width, depth, bank count, banking
+# technique and port mix for the process in a JSON configuration file (its
+# "srams" list is ignored) and print the Pareto-optimal candidates that trade
+# total area against cycle time. Only candidates of the same width, depth and
+# port mix compete (banking is the trade-off being explored, a smaller memory
+# would beat every bigger one). No views are written; only the numbers the
+# generator would put into the views are computed. For asap7 everything is
+# computed for all candidates at once with NumPy. For other nodes every
+# distinct set of Cacti inputs is characterized once (in parallel, through
+# the Cacti cache, or with the surrogate model when --estimate is given).
+################################################################################
+
+def get_args() -> argparse.Namespace:
+    """
+    Get command line arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="""
+    BSG Black-box SRAM design space sweep --
+    Evaluate ranges of SRAM shapes for a process and report the candidates
+    with the best area / cycle time trade-off.  """
+    )
+
+    parser.add_argument("config", help="JSON configuration file (process section)")
+
+    parser.add_argument(
+        "--width", action="store", help="Comma separated word widths (bits) ", required=True
+    )
+
+    parser.add_argument(
+        "--depth", action="store", help="Comma separated depths (words) ", required=True
+    )
+
+    parser.add_argument(
+        "--banks", action="store", help="Comma separated bank counts ", required=False, default="1"
+    )
+
+    parser.add_argument(
+        "--banking_technique", action="store", help="Comma separated banking techniques (width, depth) ", required=False, default="width"
+    )
+
+    parser.add_argument(
+        "--ports", action="store", help="Comma separated port mixes, e.g. 1rw,1r1w,2r1w ", required=False, default="1rw"
+    )
+
+    parser.add_argument(
+        "--no_wmask", action="store_true", help="Candidates have no write mask ", required=False, default=False
+    )
+
+    parser.add_argument(
+        "--max_cycle_time_ns", action="store", type=float, help="Drop candidates slower than this cycle time ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "--all", action="store_true", help="Print every candidate (with a pareto column) instead of only the Pareto front ", required=False, default=False
+    )
+
+    parser.add_argument(
+        "--output", action="store", help="Write the table as CSV to this file instead of stdout ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "--work_dir", action="store", help="Directory for CACTI runs ", required=False, default=os.sep.join([os.getcwd(), 'sweep'])
+    )
+
+    parser.add_argument(
+        "--cacti_dir", action="store", help="CACTI installation directory ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "-j", "--jobs", action="store", type=int, help="Number of CACTI runs in parallel (0 = one per CPU) ", required=False, default=0
+    )
+
+    parser.add_argument(
+        "--estimate", action="store_true", help="Estimate CACTI results with the surrogate model instead of running CACTI ", required=False, default=False
+    )
+
+    parser.add_argument(
+        "--cache-dir", action="store", help="Directory for the persistent CACTI result cache ", required=False, default=None
+    )
+
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always run CACTI, do not read or write the result cache ", required=False, default=False
+    )
+
+    return parser.parse_args()
+
+
+# parse_ports: '2r1w' -> {'r': 2, 'w': 1, 'rw': 0}
+def parse_ports( spec ):
+  ports = {'r': 0, 'w': 0, 'rw': 0}
+  if not re.fullmatch(r'(\d+(rw|r|w))+', spec):
+    raise Exception(f"Can't parse port mix '{spec}', use e.g. 1rw, 1r1w or 2r1w")
+  for count, kind in re.findall(r'(\d+)(rw|r|w)', spec):
+    ports[kind] += int(count)
+  return ports
+
+
+# candidates: every combination of the swept values as sram entries, the same
+# as the ones of the "srams" list in a JSON configuration file.
+def candidates( args ):
+  srams = []
+  for width, depth, banks, technique, ports in itertools.product(
+        [int(v) for v in args.width.split(',')], [int(v) for v in args.depth.split(',')],
+        [int(v) for v in args.banks.split(',')], args.banking_technique.split(','), args.ports.split(',')):
+    # Banking only splits an even number of banks, skip duplicates otherwise
+    if technique != args.banking_technique.split(',')[0] and not (banks > 1 and banks % 2 == 0):
+      continue
+    srams.append({ 'name' : f'sweep_{width}x{depth}_{banks}{technique[0]}_{ports}'
+                 , 'width' : width, 'depth' : depth, 'banks' : banks, 'banking_technique' : technique
+                 , 'no_wmask' : 'true' if args.no_wmask else 'false', 'ports' : parse_ports(ports) })
+  return srams
+
+
+# evaluate: arrays of per-bank macro width/height (snapped), cycle and access
+# time and leakage for every candidate, and a mask of the candidates that could
+# be built (the values of the others are NaN).
+def evaluate( process, srams, args ):
+  num_banks = np.array([s['banks'] for s in srams])
+  if process.tech_nm == 7:
+    height_um, width_um = get_macro_dimensions_batch(process, [s['width'] for s in srams], [s['depth'] for s in srams],
+                                                     num_banks, [s['banking_technique'] for s in srams],
+                                                     [s['ports']['r'] for s in srams], [s['ports']['w'] for s in srams],
+                                                     [s['ports']['rw'] for s in srams], not args.no_wmask)
+    cycle_time_ns = np.full(len(srams), 0.1566)
+    access_time_ns = np.full(len(srams), 0.2183)
+    leakage_mW = np.full(len(srams), 0.1289)
+    built = np.ones(len(srams), dtype=bool)
+  else:
+    banked = (num_banks > 1) & (num_banks % 2 == 0)
+    by_depth = banked & np.array([s['banking_technique'] == 'depth' for s in srams])
+    by_width = banked & ~by_depth
+    width_in_bits = np.where(by_width, -(-np.array([s['width'] for s in srams]) // num_banks), [s['width'] for s in srams])
+    depth = np.where(by_depth, -(-np.array([s['depth'] for s in srams]) // num_banks), [s['depth'] for s in srams])
+    keys = [cacti_inputs(process, s) for s in srams]
+    results = characterize(process, sorted(set(keys), key=repr), args)
+    # Candidates cacti cannot build have no row (and keep their own inputs)
+    rows = [results[k][0] if results[k] else None for k in keys]
+    used = [results[k][1] if results[k] else k for k in keys]
+    built = np.array([row is not None for row in rows])
+    column = lambda col: np.array([float(row[col]) if row else np.nan for row in rows])
+    cycle_time_ns = column(5)
+    access_time_ns = column(4)
+    leakage_mW = column(9)
+    width_um = column(12)
+    height_um = column(13)
+    # Scale substitute shapes back to the requested size (see Memory)
+    key_bytes = np.array([k[1] for k in keys])
+    cacti_width_in_bits = width_in_bits + 8 * (np.array([u[1] for u in used]) - key_bytes)
+    cacti_depth = np.array([u[0] // u[1] for u in used])
+    width_um = width_um * width_in_bits / cacti_width_in_bits
+    height_um = height_um * depth / cacti_depth
+    width_um = np.ceil(width_um * 1000.0 / process.snapWidth_nm) * process.snapWidth_nm / 1000.0
+    height_um = np.ceil(height_um * 1000.0 / process.snapHeight_nm) * process.snapHeight_nm / 1000.0
+  return width_um, height_um, cycle_time_ns, access_time_ns, leakage_mW, built
+
+
+# characterize: cacti csv row and the cacti inputs actually used for every
+# distinct set of cacti inputs (None for the ones cacti cannot build, not even
+# as a substitute shape).
+def characterize( process, keys, args ):
+  cacti_cache = None if args.no_cache else CactiCache(args.cache_dir)
+  if args.estimate:
+    surrogate = CactiSurrogate.from_cache(cacti_cache if cacti_cache else CactiCache(args.cache_dir), args.cacti_dir if args.cacti_dir else os.environ.get('CACTI_BUILD_DIR'))
+    print(surrogate.report(), file=sys.stderr)
+    return { key : (surrogate.row(key), key) for key in keys }
+
+  jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+  runner = CactiRunner(args.cacti_dir if args.cacti_dir else os.environ['CACTI_BUILD_DIR'], cacti_cache, retry_strategy(process), jobs=jobs)
+  def run( key ):
+    work_dir = os.sep.join([args.work_dir, 'cacti_%dB_%d_%drw%dr%dw' % (key[1], key[0] // key[1], key[2], key[3], key[4])])
+    os.makedirs( work_dir, exist_ok=True )
+    try:
+      result, used_key = runner.characterize(key, work_dir)
+    except CactiError as e:
+      print(e)
+      return None
+    return result.row, used_key
+  # Keep the progress messages of the runner out of the table on stdout
+  with contextlib.redirect_stdout(sys.stderr), ThreadPoolExecutor(max_workers=jobs) as pool:
+    return dict(zip(keys, pool.map(run, keys)))
+
+
+# pareto_front: mask of the candidates no other candidate beats on both area
+# and cycle time.
+def pareto_front( area, cycle_time ):
+  order = np.lexsort((cycle_time, area))
+  best = np.minimum.accumulate(cycle_time[order])
+  front = np.empty(len(area), dtype=bool)
+  front[order] = np.concatenate(([True], cycle_time[order][1:] < best[:-1]))
+  return front
+
+
+def main ( args : argparse.Namespace):
+
+  # Load the JSON configuration file (the srams come from the sweep)
+  try:
+    json_data = load_config(args.config, need_srams=False)
+  except ConfigError as e:
+    sys.exit(f'Invalid configuration {e}')
+
+  process = Process(json_data)
+  srams = candidates(args)
+  try:
+    width_um, height_um, cycle_time_ns, access_time_ns, leakage_mW, built = evaluate(process, srams, args)
+  except SurrogateError as e:
+    sys.exit(f'Cannot estimate cacti results: {e}')
+  for i in np.flatnonzero(~built):
+    print(f'Cannot build {srams[i]["name"]}, left out of the sweep', file=sys.stderr)
+  # Only an even number of banks is split into several macros (see Memory)
+  num_banks = np.array([s['banks'] for s in srams])
+  num_macros = np.where((num_banks > 1) & (num_banks % 2 == 0), num_banks, 1)
+  total_area_um2 = width_um * height_um * num_macros
+
+  # The Pareto front of every width, depth and port mix
+  keep = built if args.max_cycle_time_ns is None else built & (cycle_time_ns <= args.max_cycle_time_ns)
+  front = np.zeros(len(srams), dtype=bool)
+  groups = {}
+  for i, s in enumerate(srams):
+    if keep[i]:
+      groups.setdefault((s['width'], s['depth'], tuple(sorted(s['ports'].items()))), []).append(i)
+  for members in groups.values():
+    members = np.array(members)
+    front[members] = pareto_front(total_area_um2[members], cycle_time_ns[members])
+
+  fid = open(args.output, 'w') if args.output else sys.stdout
+  fid.write('name,width,depth,banks,banking_technique,r,w,rw,macro_width_um,macro_height_um,total_area_um2,cycle_time_ns,access_time_ns,leakage_mW%s\n' % (',pareto' if args.all else ''))
+  for i in np.argsort(total_area_um2, kind='stable'):
+    if not keep[i] or not (args.all or front[i]):
+      continue
+    s = srams[i]
+    fid.write('%s,%d,%d,%d,%s,%d,%d,%d,%.3f,%.3f,%.3f,%.4f,%.4f,%.4f%s\n' % (
+      s['name'], s['width'], s['depth'], s['banks'], s['banking_technique'], s['ports']['r'], s['ports']['w'], s['ports']['rw'],
+      width_um[i], height_um[i], total_area_um2[i], cycle_time_ns[i], access_time_ns[i], leakage_mW[i], (',%d' % front[i]) if args.all else ''))
+  if args.output:
+    fid.close()
+
+### Entry point
+if __name__ == '__main__':
+  args = get_args()
+  main( args )
@@ -28,4 +28,70 @@ def get_macro_dimensions(process, sram_data):
   # Dimensions need to be at least 6.221 otherwise PDN will cause error
   total_width = max(6.221, total_width)
   total_height = max(6.221, total_height)
-  return total_height, total_width
\ No newline at end of file
+  return total_height, total_width
+
+# get_port_multiplier: height and width multiplier of an asap7 macro based on
+# the amount of r, w, and rw ports and the write mask.
+def get_port_multiplier(r_ports, w_ports, rw_ports, has_wmask):
+  overall_mult = 1
+  wmask_mult = 0 if has_wmask == False else 0.045
+  # ASSUMING there is more than 1 port
+  if r_ports + rw_ports + w_ports > 1:
+    r_port_mult = r_ports * 0.3
+    # Add wmask_mult to per-port multipliers for w and rw
+    w_port_mult = w_ports * (0.25 + wmask_mult)
+    rw_port_mult = rw_ports * (0.4 + wmask_mult)
+    overall_mult = (1 + r_port_mult + w_port_mult + rw_port_mult)
+  return overall_mult + wmask_mult
+
+# get_macro_dimensions_batch: asap7 macro heights and widths for arrays of
+# srams in one NumPy pass. Takes arrays (or scalars) of word widths, depths,
+# bank counts, banking techniques ('width'/'depth'), port counts and write mask
+# flags, and returns arrays of the final (banked, port scaled and snapped)
+# heights and widths, identical to what the Memory class computes one sram at
+# a time.
+def get_macro_dimensions_batch(process, width_in_bits, depth, num_banks, banking_technique, r_ports, w_ports, rw_ports, has_wmask):
+  import numpy as np
+  contacted_poly_pitch_um = process.contacted_poly_pitch_nm / 1000
+  column_mux_factor       = process.column_mux_factor
+  fin_pitch_um            = process.fin_pitch_nm / 1000
+  width_in_bits, depth, num_banks, banking_technique, r_ports, w_ports, rw_ports, has_wmask = np.broadcast_arrays(
+      np.asarray(width_in_bits, dtype=np.int64), np.asarray(depth, dtype=np.int64), np.asarray(num_banks, dtype=np.int64),
+      np.asarray(banking_technique), np.asarray(r_ports, dtype=np.int64), np.asarray(w_ports, dtype=np.int64),
+      np.asarray(rw_ports, dtype=np.int64), np.asarray(has_wmask, dtype=bool))
+
+  # Banking splices either width or depth (see Memory)
+  banked = (num_banks > 1) & (num_banks % 2 == 0)
+  by_depth = banked & (banking_technique == 'depth')
+  by_width = banked & ~by_depth
+  width_in_bits = np.where(by_width, -(-width_in_bits // num_banks), width_in_bits)
+  depth = np.where(by_depth, -(-depth // num_banks), depth)
+
+  # Corresponds to the recommended 122 cell in asap7
+  bitcell_height = 10 * fin_pitch_um
+  bitcell_width = 2 * contacted_poly_pitch_um
+
+  all_bitcell_height =  bitcell_height * (width_in_bits / 2 + depth)
+  all_bitcell_width =  bitcell_width * (width_in_bits / 2)
+
+  all_bitcell_height = all_bitcell_height / column_mux_factor
+  all_bitcell_width = all_bitcell_width * column_mux_factor
+
+  total_height = all_bitcell_height * 1.2
+  total_width = all_bitcell_width * 1.2
+
+  # Dimensions need to be at least 6.221 otherwise PDN will cause error
+  total_width = np.maximum(6.221, total_width)
+  total_height = np.maximum(6.221, total_height)
+
+  # Port and write mask multipliers, computed once per distinct port mix
+  port_mixes, mix_index = np.unique(np.stack([r_ports, w_ports, rw_ports, has_wmask]).reshape(4, -1), axis=1, return_inverse=True)
+  port_mult = np.array([get_port_multiplier(int(r), int(w), int(rw), bool(wm)) for r, w, rw, wm in port_mixes.T])
+  port_mult = port_mult[mix_index.reshape(-1)].reshape(total_height.shape)
+  total_height = total_height * port_mult
+  total_width = total_width * port_mult
+
+  # Adjust to snap
+  total_width = (np.ceil((total_width*1000.0)/process.snapWidth_nm)*process.snapWidth_nm)/1000.0
+  total_height = (np.ceil((total_height*1000.0)/process.snapHeight_nm)*process.snapHeight_nm)/1000.0
+  return total_height, total_width
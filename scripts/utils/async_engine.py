@@ -0,0 +1,67 @@
+import os
+import asyncio
+import traceback
+from utils.cacti_runner import CactiRunner
+from utils.class_memory import cacti_inputs, corner_cacti_inputs, cacti_work_dir, results_dir_for, retry_strategy
+
+################################################################################
+# ASYNC GENERATION ENGINE
+#
+# Generates a list of srams from a single process using asyncio. Cacti runs as
+# a subprocess, so all the python side does while cacti works is wait. Each
+# distinct set of cacti inputs is characterized once with at most
+# `max_cacti_jobs` cacti processes in flight, and the views of every sram
+# sharing that result are written as soon as it lands rather than after the
+# whole batch has been characterized.
+################################################################################
+
+# generate_srams_async: generate_sram(process, sram_data, output_dir,
+# cacti_dir, cacti_cache, cacti_memo) builds one memory and writes its views.
+# Cacti inputs already in cacti_memo are not characterized again. If given,
+# on_result is called (from the event loop) with what generate_sram returned
+# for every sram that succeeded. Returns a dict of sram name to traceback text
+# for every sram that failed. The cacti runs are recorded in timings (see
+# timings.py).
+def generate_srams_async( generate_sram, process, srams, output_dir, cacti_dir, cacti_cache, max_cacti_jobs, cacti_memo = None, on_result = None, timings = None ):
+  return asyncio.run( generate_all( generate_sram, process, srams, output_dir, cacti_dir, cacti_cache, max_cacti_jobs, cacti_memo, on_result, timings ) )
+
+async def generate_all( generate_sram, process, srams, output_dir, cacti_dir, cacti_cache, max_cacti_jobs, cacti_memo = None, on_result = None, timings = None ):
+  semaphore = asyncio.Semaphore(max_cacti_jobs)
+  cacti_memo = dict(cacti_memo) if cacti_memo else {}
+  failed = {}
+
+  groups = {}
+  for i, sram_data in enumerate(srams):
+    key = cacti_inputs(process, sram_data)
+    groups.setdefault(key if key is not None else i, []).append(sram_data)
+
+  async def generate_group( key, members ):
+    loop = asyncio.get_running_loop()
+    # The nominal cacti inputs and those of every extra operating corner
+    pending = [ k for k in dict.fromkeys([key] + list(corner_cacti_inputs(process, key).values())) if k not in cacti_memo ] if isinstance(key, tuple) else []
+    if pending:
+      results_dir = results_dir_for(output_dir, str(members[0]['name']))
+      try:
+        os.makedirs( results_dir, exist_ok=True )
+        runner = CactiRunner(cacti_dir if cacti_dir else os.environ['CACTI_BUILD_DIR'], cacti_cache, retry_strategy(process), timings, str(members[0]['name'])
+                            , max_cacti_jobs, semaphore)
+        async def characterize( k ):
+          result, used_cacti_key = await runner.characterize_async(k, cacti_work_dir(results_dir, k))
+          cacti_memo[k] = (result.row, used_cacti_key)
+        await asyncio.gather( *[characterize(k) for k in pending] )
+      except Exception:
+        for sram_data in members:
+          failed[str(sram_data['name'])] = traceback.format_exc()
+        return
+    # Cacti results are in the memo, so building the memories only writes files
+    for sram_data in members:
+      try:
+        result = await loop.run_in_executor(None, generate_sram, process, sram_data, output_dir, cacti_dir, cacti_cache, cacti_memo)
+      except Exception:
+        failed[str(sram_data['name'])] = traceback.format_exc()
+        continue
+      if on_result:
+        on_result(result)
+
+  await asyncio.gather( *[generate_group(key, members) for key, members in groups.items()] )
+  return failed
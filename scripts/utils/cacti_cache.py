@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import tempfile
+
+################################################################################
+# CACTI CACHE
+#
+# Persistent, content-addressed cache of Cacti results. Entries are keyed on a
+# hash of the rendered cacti.cfg text plus the identity of the Cacti binary
+# that produced them, and store the parsed CSV row Cacti wrote out. The cache
+# is bounded in size; when it grows past the limit the least recently used
+# entries are evicted, down to 90% of the limit. The size is tracked as a
+# running total (the directory is only listed when the total passes the limit),
+# so a put usually costs a single write.
+# Entries are written atomically so several generator processes can share one
+# cache directory; the entries other processes add are counted the next time
+# the directory is listed.
+#
+# Configurations Cacti cannot build are cached as well (with the reason), so
+# later runs skip straight to a substitute shape (crashes and killed runs are
+# not, see CactiRunner.cannot_build). Since the key includes the
+# Cacti binary, rebuilding Cacti invalidates them; clear_failures() drops them
+# explicitly.
+################################################################################
+
+def default_cache_dir():
+  base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+  return os.path.join(base, 'bsg_fakeram', 'cacti')
+
+# cacti_binary_id: hash of the Cacti binary in cacti_dir (of the directory
+# name if there is no binary).
+def cacti_binary_id( cacti_dir ):
+  h = hashlib.sha256()
+  try:
+    with open( os.sep.join([cacti_dir, 'cacti']), 'rb' ) as fid:
+      for chunk in iter(lambda: fid.read(1 << 20), b''):
+        h.update(chunk)
+  except FileNotFoundError:
+    h.update(os.path.abspath(cacti_dir).encode())
+  return h.hexdigest()
+
+# Eviction leaves the cache at this fraction of its limit, so the directory is
+# not listed again on the very next put
+EVICT_TO = 0.9
+
+class CactiCache:
+
+  def __init__( self, cache_dir = None, max_size_mb = 64 ):
+    self.cache_dir = cache_dir if cache_dir else default_cache_dir()
+    self.max_bytes = int(max_size_mb * 1024 * 1024)
+    self.binary_ids = {}
+    self.size_bytes = None   ;# running total of the entry sizes, None until the directory is listed
+    if not os.path.exists( self.cache_dir ):
+      os.makedirs( self.cache_dir, exist_ok=True )
+
+  # binary_id: identify the Cacti build so a rebuilt (or re-patched) Cacti
+  # never returns results from a different binary.
+  def binary_id( self, cacti_dir ):
+    if cacti_dir not in self.binary_ids:
+      self.binary_ids[cacti_dir] = cacti_binary_id( cacti_dir )
+    return self.binary_ids[cacti_dir]
+
+  def key( self, cfg_text, cacti_dir ):
+    h = hashlib.sha256()
+    h.update(self.binary_id(cacti_dir).encode())
+    h.update(b'\0')
+    h.update(cfg_text.encode())
+    return h.hexdigest()
+
+  def __path( self, key, suffix = '.json' ):
+    return os.sep.join([self.cache_dir, key + suffix])
+
+  # get: return the cached CSV row for this config, or None on a miss.
+  def get( self, cfg_text, cacti_dir ):
+    entry = self.__read( self.__path(self.key(cfg_text, cacti_dir)) )
+    return entry['row'] if entry else None
+
+  def put( self, cfg_text, cacti_dir, row ):
+    self.__write( self.__path(self.key(cfg_text, cacti_dir)), {'config': cfg_text, 'row': row} )
+
+  # results: every cached (config text, CSV row) pair, with cacti_dir only the
+  # ones produced by the Cacti binary in cacti_dir.
+  def results( self, cacti_dir = None ):
+    for fname in sorted(os.listdir(self.cache_dir)):
+      if not fname.endswith('.json') or fname.endswith('.fail.json'):
+        continue
+      try:
+        with open( os.sep.join([self.cache_dir, fname]), 'r' ) as fid:
+          entry = json.load(fid)
+      except (FileNotFoundError, ValueError):
+        continue
+      # The entry name is the key, which includes the binary
+      if cacti_dir is not None and fname[:-len('.json')] != self.key(entry['config'], cacti_dir):
+        continue
+      yield entry['config'], entry['row']
+
+  # get_failure: return the reason cacti failed on this config before, or
+  # None if it is not known to fail.
+  def get_failure( self, cfg_text, cacti_dir ):
+    entry = self.__read( self.__path(self.key(cfg_text, cacti_dir), '.fail.json') )
+    return entry['reason'] if entry else None
+
+  def put_failure( self, cfg_text, cacti_dir, reason ):
+    self.__write( self.__path(self.key(cfg_text, cacti_dir), '.fail.json'), {'config': cfg_text, 'reason': reason} )
+
+  def clear_failures( self ):
+    for fname in os.listdir(self.cache_dir):
+      if fname.endswith('.fail.json'):
+        try:
+          os.remove(os.sep.join([self.cache_dir, fname]))
+        except FileNotFoundError:
+          pass
+    self.size_bytes = None
+
+  def __read( self, path ):
+    try:
+      with open( path, 'r' ) as fid:
+        entry = json.load(fid)
+    except (FileNotFoundError, ValueError):
+      return None
+    # Touch the entry so eviction sees it as recently used
+    try:
+      os.utime(path)
+    except FileNotFoundError:
+      pass
+    return entry
+
+  def __write( self, path, entry ):
+    fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as fid:
+      json.dump(entry, fid)
+    size = os.path.getsize(tmp)
+    try:
+      size -= os.path.getsize(path)
+    except FileNotFoundError:
+      pass
+    os.replace(tmp, path)
+    # Concurrent puts from threads may miscount a little, the next listing of
+    # the directory corrects the total
+    if self.size_bytes is None:
+      self.size_bytes = self.__evict()
+    else:
+      self.size_bytes += size
+      if self.size_bytes > self.max_bytes:
+        self.size_bytes = self.__evict()
+
+  # __evict: drop least recently used entries until the cache fits (down to
+  # EVICT_TO of the limit once it does not). Returns the size of the entries
+  # left.
+  def __evict( self ):
+    entries = []
+    total = 0
+    for fname in os.listdir(self.cache_dir):
+      if not fname.endswith('.json'):
+        continue
+      try:
+        st = os.stat(os.sep.join([self.cache_dir, fname]))
+      except FileNotFoundError:
+        continue
+      entries.append((st.st_mtime, st.st_size, fname))
+      total += st.st_size
+    entries.sort()
+    limit = self.max_bytes if total <= self.max_bytes else self.max_bytes * EVICT_TO
+    for mtime, size, fname in entries:
+      if total <= limit:
+        break
+      try:
+        os.remove(os.sep.join([self.cache_dir, fname]))
+      except FileNotFoundError:
+        pass
+      total -= size
+    return total
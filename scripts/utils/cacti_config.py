@@ -1,3 +1,5 @@
+import re
+
 ################################################################################
 # CACTI CONFIG
 #
@@ -35,7 +37,7 @@ cacti_config = '''# cacti.cfg
 -Data array peripheral type - "itrs-hp"
 -Tag array cell type - "itrs-lop"
 -Tag array peripheral type - "itrs-hp"
--operating temperature (K) 300
+-operating temperature (K) {9}
 -cache type "{8}"
 -tag size (b) "default"
 -access mode (normal, sequential, fast) - "normal"
@@ -88,3 +90,37 @@ cacti_config = '''# cacti.cfg
 -DIMM model "ALL"
 -mirror_in_bob "F"
 '''
+
+# Cacti only models operating temperatures from 300K to 400K in 10K steps
+CACTI_MIN_TEMPERATURE_K = 300
+CACTI_MAX_TEMPERATURE_K = 400
+
+# cacti_temperature: the temperature (K) cacti is run at for an operating
+# temperature in degrees C, rounded to a 10K step and clamped to what cacti
+# supports.
+def cacti_temperature( temperature_c ):
+  temperature_k = int(round((temperature_c + 273.15) / 10.0)) * 10
+  return min(CACTI_MAX_TEMPERATURE_K, max(CACTI_MIN_TEMPERATURE_K, temperature_k))
+
+# render_cacti_config: fill in the configuration above for a tuple of cacti
+# inputs (see class_memory.cacti_inputs).
+def render_cacti_config( cacti_key ):
+  total_size, width_in_bytes, rw_ports, r_ports, w_ports, tech_um, cache_type, temperature_k = cacti_key
+  return cacti_config.format( total_size
+       , width_in_bytes, rw_ports, r_ports, w_ports
+       , tech_um, width_in_bytes*8, 1
+       , cache_type, temperature_k )
+
+# parse_cacti_config: recover the tuple of cacti inputs from a configuration
+# rendered by render_cacti_config.
+def parse_cacti_config( cfg_text ):
+  def field( pattern ):
+    return re.search(pattern, cfg_text, re.MULTILINE).group(1)
+  return ( int(field(r'^-size \(bytes\) (\d+)'))
+         , int(field(r'^-block size \(bytes\) (\d+)'))
+         , int(field(r'^-read-write port (\d+)'))
+         , int(field(r'^-exclusive read port (\d+)'))
+         , int(field(r'^-exclusive write port (\d+)'))
+         , float(field(r'^-technology \(u\) ([0-9.]+)'))
+         , field(r'^-cache type "([^"]*)"')
+         , int(field(r'^-operating temperature \(K\) (\d+)')) )
@@ -0,0 +1,64 @@
+import math
+
+################################################################################
+# CACTI RETRY STRATEGY
+#
+# Cacti cannot build every shape. When the requested shape fails, the memory is
+# characterized as a nearby shape that cacti can build instead and the
+# resulting macro is scaled back to the requested size. This class decides
+# which substitute shapes to try, and in which order:
+#
+#   linear - the original behavior (and the default), try the word one byte
+#            wider.
+#   search - try word widths both wider and narrower and depths up and down,
+#            shapes with power-of-two widths/depths first, then the shapes
+#            closest to the requested size. Up to `parallel` candidates are
+#            run at the same time.
+#
+# Shapes that are known to fail (for a technology, port mix and cache type)
+# are never tried again in this process.
+################################################################################
+
+# Known failing cacti inputs, shared by every runner in this process
+known_failures = set()
+
+class RetryStrategy:
+
+  def __init__( self, strategy = 'linear', max_attempts = 8, parallel = 4 ):
+    if strategy not in ('search', 'linear'):
+      raise Exception("Unsupported cacti retry strategy '{}', use either 'search' or 'linear' ('linear' is DEFAULT)".format(strategy))
+    self.strategy     = strategy
+    self.max_attempts = max_attempts
+    self.parallel     = parallel if strategy == 'search' else 1
+
+  # candidates: substitute cacti inputs to try, in order, when cacti_key fails.
+  def candidates( self, cacti_key ):
+    total_size, width_in_bytes = cacti_key[0], cacti_key[1]
+    depth = total_size // width_in_bytes
+    if self.strategy == 'linear':
+      shapes = [(width_in_bytes + 1, depth)]
+    else:
+      widths = set(width_in_bytes + i for i in range(-3, 4))
+      widths |= set([prev_pow2(width_in_bytes), next_pow2(width_in_bytes)])
+      depths = set([depth, prev_pow2(depth), next_pow2(depth)])
+      shapes = [(w, d) for w in widths for d in depths if w >= 1 and d >= 2 and (w, d) != (width_in_bytes, depth)]
+      shapes.sort(key=lambda s: ( (not is_pow2(s[0])) + (not is_pow2(s[1]))
+                                , abs(math.log2((s[0] * s[1]) / total_size))
+                                , s[1] != depth
+                                , s ))
+    keys = [ (w * d, w) + tuple(cacti_key[2:]) for w, d in shapes ]
+    return [ k for k in keys if k not in known_failures ][:self.max_attempts]
+
+  # batches: the candidates split into groups that are probed together.
+  def batches( self, cacti_key ):
+    keys = self.candidates( cacti_key )
+    return [ keys[i:i + self.parallel] for i in range(0, len(keys), self.parallel) ]
+
+def is_pow2( n ):
+  return n > 0 and (n & (n - 1)) == 0
+
+def next_pow2( n ):
+  return 1 << max(0, (n - 1).bit_length())
+
+def prev_pow2( n ):
+  return 1 << max(0, n.bit_length() - 1)
@@ -0,0 +1,219 @@
+import os
+import asyncio
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from utils.cacti_config import render_cacti_config
+from utils.cacti_retry import RetryStrategy, known_failures
+from utils.timings import Timings
+
+################################################################################
+# CACTI RUNNER
+#
+# Runs Cacti on a rendered configuration. Each run writes its configuration,
+# Cacti's csv output and Cacti's stdout/stderr logs into its own work
+# directory, and Cacti is launched with its own working directory instead of
+# changing the working directory of this process. Nothing here touches
+# process-global state, so any number of runs can be in flight at once from
+# threads, asyncio tasks or worker processes.
+#
+# Cacti cannot build every shape, so characterize() falls back to the
+# substitute shapes of a RetryStrategy (see cacti_retry.py) before giving up.
+#
+# Every run (nominal shape or substitute) holds a slot of the runner's
+# semaphore while cacti runs, so no more than `jobs` cacti processes are in
+# flight however many shapes are tried at once. The semaphore can be shared
+# between runners (an asyncio.Semaphore for run_async).
+################################################################################
+
+class CactiError(Exception):
+  pass
+
+# Cacti exits normally with an "ERROR: ..." message when it cannot build a
+# configuration (e.g. "ERROR: no valid tag organization found"). Only such
+# failures are cached; a crash, a signal (timeout, OOM kill) or any other exit
+# may not happen again and is retried on the next run.
+CANNOT_BUILD_RETURNCODES = (0, 1)
+CANNOT_BUILD_PREFIX      = 'ERROR'
+
+class CactiResult:
+
+  def __init__( self, cfg_path, out_path, stdout_path, stderr_path, returncode, row, cached = False, reason = None ):
+    self.cfg_path    = cfg_path
+    self.out_path    = out_path
+    self.stdout_path = stdout_path
+    self.stderr_path = stderr_path
+    self.returncode  = returncode
+    self.row         = row      ;# last csv row cacti wrote out, None if cacti failed
+    self.cached      = cached
+    self.reason      = reason   ;# why cacti failed, None if it did not
+
+  @property
+  def ok( self ):
+    return self.row is not None
+
+class CactiRunner:
+
+  # timings (see timings.py) records the stages of every run under the sram
+  # `name`. At most jobs cacti processes run at once, semaphore defaults to a
+  # semaphore of that many slots.
+  def __init__( self, cacti_dir, cacti_cache = None, retry = None, timings = None, name = None, jobs = 1, semaphore = None ):
+    self.cacti_dir   = cacti_dir
+    self.cacti_cache = cacti_cache
+    self.retry       = retry if retry else RetryStrategy()
+    self.timings     = timings if timings else Timings()
+    self.name        = name
+    self.jobs        = jobs
+    self.semaphore   = semaphore if semaphore else threading.BoundedSemaphore(jobs)
+
+  # run: write cfg_text to <work_dir>/<name>.cfg and run cacti on it. Cacti
+  # writes its csv results to <name>.cfg.out, stdout goes to <name>.log and
+  # stderr to <name>.err (all in work_dir).
+  def run( self, cfg_text, work_dir, name = 'cacti' ):
+    result = self.__prepare( cfg_text, work_dir, name )
+    if result.cached:
+      return result
+    with self.semaphore, self.timings.stage( self.name, 'cacti', run=name ), open( result.stdout_path, 'w' ) as out, open( result.stderr_path, 'w' ) as err:
+      proc = subprocess.run( self.__command( result.cfg_path ), cwd=self.cacti_dir, stdout=out, stderr=err )
+    return self.__finish( cfg_text, result, proc.returncode )
+
+  # run_async: same as run, but waits on cacti without blocking the event loop.
+  async def run_async( self, cfg_text, work_dir, name = 'cacti' ):
+    result = self.__prepare( cfg_text, work_dir, name )
+    if result.cached:
+      return result
+    async with self.semaphore:
+      with self.timings.stage( self.name, 'cacti', run=name ), open( result.stdout_path, 'w' ) as out, open( result.stderr_path, 'w' ) as err:
+        proc = await asyncio.create_subprocess_exec( *self.__command( result.cfg_path ), cwd=self.cacti_dir, stdout=out, stderr=err )
+        returncode = await proc.wait()
+    return self.__finish( cfg_text, result, returncode )
+
+  # characterize: run cacti for a tuple of cacti inputs, falling back to the
+  # substitute shapes of the retry strategy when cacti cannot build it. Each
+  # batch of substitutes is run in parallel (up to jobs at once) and the first
+  # one (in the order of the strategy) that works is used. Returns the CactiResult and the cacti
+  # inputs that cacti finally ran with.
+  def characterize( self, cacti_key, work_dir ):
+    if cacti_key not in known_failures:
+      result = self.run( self.__render(cacti_key), work_dir )
+      if result.ok:
+        return result, cacti_key
+      self.__failed( cacti_key, result )
+    for batch in self.retry.batches( cacti_key ):
+      self.__retrying( cacti_key, batch )
+      with ThreadPoolExecutor(max_workers=min(len(batch), self.jobs)) as pool:
+        results = list(pool.map(lambda key: self.run( self.__render(key), work_dir, self.__probe_name(key) ), batch))
+      found = self.__first_ok( batch, results )
+      if found:
+        return found
+    raise CactiError(f'cacti could not build {shape_str(cacti_key)} or any substitute shape, see the cacti logs in {work_dir}')
+
+  async def characterize_async( self, cacti_key, work_dir ):
+    if cacti_key not in known_failures:
+      result = await self.run_async( self.__render(cacti_key), work_dir )
+      if result.ok:
+        return result, cacti_key
+      self.__failed( cacti_key, result )
+    for batch in self.retry.batches( cacti_key ):
+      self.__retrying( cacti_key, batch )
+      results = await asyncio.gather( *[self.run_async( self.__render(key), work_dir, self.__probe_name(key) ) for key in batch] )
+      found = self.__first_ok( batch, results )
+      if found:
+        return found
+    raise CactiError(f'cacti could not build {shape_str(cacti_key)} or any substitute shape, see the cacti logs in {work_dir}')
+
+  def __render( self, cacti_key ):
+    with self.timings.stage( self.name, 'cacti_config' ):
+      return render_cacti_config( cacti_key )
+
+  # __retrying: record a batch of substitute shapes about to be tried.
+  def __retrying( self, cacti_key, batch ):
+    self.timings.record( sram=self.name, stage='retry', shape=shape_str(cacti_key), temperature_K=cacti_key[-1], substitutes=len(batch), pid=os.getpid() )
+
+  def __first_ok( self, batch, results ):
+    found = None
+    for key, result in zip(batch, results):
+      if not result.ok:
+        self.__failed( key, result )
+      elif found is None:
+        found = (result, key)
+    return found
+
+  def __failed( self, cacti_key, result ):
+    known_failures.add( cacti_key )
+    print(f"Cacti could not build {shape_str(cacti_key)}{' (known failure)' if result.cached else ''}: {result.reason}. Attempting again with different values.")
+
+  def __probe_name( self, cacti_key ):
+    return 'cacti_%dx%d' % (cacti_key[1] * 8, cacti_key[0] // cacti_key[1])
+
+  def __command( self, cfg_path ):
+    return [os.sep.join(['.', 'cacti']), '-infile', os.path.abspath(cfg_path)]
+
+  def __prepare( self, cfg_text, work_dir, name ):
+    cfg_path    = os.sep.join([work_dir, name + '.cfg'])
+    out_path    = cfg_path + '.out'
+    stdout_path = os.sep.join([work_dir, name + '.log'])
+    stderr_path = os.sep.join([work_dir, name + '.err'])
+
+    with open( cfg_path, 'w' ) as fid:
+      fid.write( cfg_text )
+
+    if self.cacti_cache:
+      with self.timings.stage( self.name, 'cache', run=name ):
+        row = self.cacti_cache.get(cfg_text, self.cacti_dir)
+        reason = self.cacti_cache.get_failure(cfg_text, self.cacti_dir) if row is None else None
+      if row is not None:
+        return CactiResult(cfg_path, None, None, None, 0, row, cached=True)
+      if reason is not None:
+        return CactiResult(cfg_path, None, None, None, None, None, cached=True, reason=reason)
+
+    # Never pick up the results of an earlier run
+    if os.path.exists( out_path ):
+      os.remove( out_path )
+    return CactiResult(cfg_path, out_path, stdout_path, stderr_path, None, None)
+
+  def __finish( self, cfg_text, result, returncode ):
+    result.returncode = returncode
+    with self.timings.stage( self.name, 'parse' ):
+      result.row = self.read_row( result.out_path )
+    if result.row is None:
+      result.reason = self.read_reason( result )
+    if self.cacti_cache:
+      if result.row is not None:
+        self.cacti_cache.put(cfg_text, self.cacti_dir, result.row)
+      elif self.cannot_build( result ):
+        self.cacti_cache.put_failure(cfg_text, self.cacti_dir, result.reason)
+    return result
+
+  # cannot_build: True if a failed run is cacti rejecting the configuration
+  # (see CANNOT_BUILD_RETURNCODES), rather than cacti crashing or being killed.
+  @staticmethod
+  def cannot_build( result ):
+    return result.returncode in CANNOT_BUILD_RETURNCODES and result.reason.startswith(CANNOT_BUILD_PREFIX)
+
+  # read_reason: the last message cacti printed before failing.
+  @staticmethod
+  def read_reason( result ):
+    for path in (result.stderr_path, result.stdout_path):
+      with open( path, 'r' ) as fid:
+        lines = [line.strip() for line in fid if line.strip()]
+      if lines:
+        return lines[-1]
+    return f'cacti exited with code {result.returncode} without results'
+
+  # read_row: return the last csv row of a cacti output file, or None when
+  # cacti did not produce one.
+  @staticmethod
+  def read_row( out_path ):
+    try:
+      with open( out_path, 'r' ) as fid:
+        lines = [line for line in fid if line.strip()]
+    except FileNotFoundError:
+      return None
+    if not lines:
+      return None
+    return lines[-1].split(',')
+
+# shape_str: human readable word width x depth of a tuple of cacti inputs.
+def shape_str( cacti_key ):
+  return '%d bytes x %d words' % (cacti_key[1], cacti_key[0] // cacti_key[1])
@@ -0,0 +1,115 @@
+import math
+import sys
+from utils.cacti_config import parse_cacti_config
+
+################################################################################
+# CACTI SURROGATE
+#
+# A fast analytical stand-in for Cacti, fit to Cacti results from the Cacti
+# cache. Every field the Memory class reads from the Cacti csv row (access
+# time, cycle time, dynamic power, leakage, fo4 and the macro width/height) is
+# modeled as a log-linear function of the size, word width, port counts,
+# technology node, operating temperature and cache type, fit with least
+# squares (NumPy). Only the results of the Cacti binary that would be run are
+# used, results of earlier builds may differ. A held-out part of the samples is used to report how far the
+# estimates are from Cacti before the final fit on all samples. Only the cache
+# types found in the cache can be estimated.
+################################################################################
+
+class SurrogateError(Exception):
+  pass
+
+# Csv row columns predicted by the surrogate (see the Memory class)
+FIELDS = { 4  : 'access_time_ns'
+         , 5  : 'cycle_time_ns'
+         , 8  : 'pin_dynamic_power_mW'
+         , 9  : 'standby_leakage_per_bank_mW'
+         , 11 : 'fo4_ps'
+         , 12 : 'width_um'
+         , 13 : 'height_um' }
+
+class CactiSurrogate:
+
+  def __init__( self, samples, holdout_every = 5, ridge = 1e-6 ):
+    # samples: list of (cacti inputs tuple, csv row)
+    samples = sorted([ (key, row) for key, row in samples if self.__usable(row) ], key=lambda s: repr(s[0]))
+    # The first cache type is the baseline, the others get a feature each
+    self.cache_types = sorted(set(key[6] for key, row in samples))
+    num_features = len(self.features(samples[0][0])) if samples else 0
+    if len(samples) < 2 * num_features or num_features == 0:
+      raise SurrogateError(f'Not enough cacti results to fit a surrogate ({len(samples)} usable results, need at least {max(2 * num_features, 2)}), run without --estimate first to fill the cacti cache')
+    self.ridge = ridge
+
+    # Fit without the held-out samples to measure the error of the estimates
+    train   = [ s for i, s in enumerate(samples) if i % holdout_every != 0 ]
+    holdout = [ s for i, s in enumerate(samples) if i % holdout_every == 0 ]
+    self.coefficients = self.__fit(train)
+    self.holdout_error = {}
+    for col, field in FIELDS.items():
+      errors = [ abs(self.__predict(key, col) - float(row[col])) / abs(float(row[col])) for key, row in holdout ]
+      self.holdout_error[field] = sum(errors) / len(errors)
+    self.num_train   = len(train)
+    self.num_holdout = len(holdout)
+
+    # Final model uses every sample
+    self.coefficients = self.__fit(samples)
+
+  # from_cache: fit a surrogate to the results of the Cacti binary in cacti_dir
+  # in a CactiCache (to every result, with a warning, without cacti_dir).
+  @classmethod
+  def from_cache( cls, cacti_cache, cacti_dir = None, **kwargs ):
+    if cacti_dir is None:
+      print('WARNING: no Cacti directory given, the surrogate is fit to the results of every Cacti binary in the cache', file=sys.stderr)
+    return cls([ (parse_cacti_config(cfg_text), row) for cfg_text, row in cacti_cache.results(cacti_dir) ], **kwargs)
+
+  def features( self, cacti_key ):
+    total_size, width_in_bytes, rw_ports, r_ports, w_ports, tech_um, cache_type, temperature_k = cacti_key
+    s = math.log(total_size)
+    b = math.log(width_in_bytes)
+    t = math.log(tech_um)
+    p = rw_ports + r_ports + w_ports
+    k = (temperature_k - 300) / 100.0
+    return [1.0, s, b, t, s * s, s * b, s * t, b * t, rw_ports, r_ports, w_ports, p * s, p * b, k] + [ float(cache_type == c) for c in self.cache_types[1:] ]
+
+  # row: estimated cacti csv row for a tuple of cacti inputs, in the same
+  # format the Memory class reads from cacti.
+  def row( self, cacti_key ):
+    if cacti_key[6] not in self.cache_types:
+      raise SurrogateError(f'No cacti results of cache type {cacti_key[6]} to estimate {cacti_key} from (the cache has {", ".join(self.cache_types)})')
+    row = ['0'] * (max(FIELDS) + 1)
+    row[0] = str(int(round(cacti_key[5] * 1000)))
+    row[1] = str(cacti_key[0])
+    row[2] = '1'
+    row[3] = '1'
+    for col in FIELDS:
+      row[col] = '%.6g' % self.__predict(cacti_key, col)
+    return row
+
+  def report( self ):
+    lines = [f'Surrogate fit on {self.num_train} cacti results, error on {self.num_holdout} held-out results:']
+    for field, error in self.holdout_error.items():
+      lines.append(f'  {field:<28} {100.0 * error:7.2f}% mean abs error')
+    return '\n'.join(lines)
+
+  def __predict( self, cacti_key, col ):
+    x = self.features(cacti_key)
+    return math.exp(sum(c * f for c, f in zip(self.coefficients[col], x)))
+
+  # __fit: least squares fit of log(field) for every field, ridge regularized
+  # by appending sqrt(ridge) * I to the features (and zeros to the fields).
+  def __fit( self, samples ):
+    import numpy as np
+    X = np.array([ self.features(key) for key, row in samples ])
+    Y = np.log(np.array([ [ float(row[col]) for col in FIELDS ] for key, row in samples ]))
+    n = X.shape[1]
+    X = np.vstack([X, math.sqrt(self.ridge) * np.eye(n)])
+    Y = np.vstack([Y, np.zeros((n, Y.shape[1]))])
+    solution = np.linalg.lstsq(X, Y, rcond=None)[0]
+    return { col : solution[:, i].tolist() for i, col in enumerate(FIELDS) }
+
+  @staticmethod
+  def __usable( row ):
+    try:
+      return all(float(row[col]) > 0 for col in FIELDS)
+    except (IndexError, ValueError):
+      return False
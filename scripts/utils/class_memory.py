@@ -3,8 +3,67 @@ import re
 import os
 import sys
 from pathlib import Path
-from utils.cacti_config import cacti_config
-from utils.area import get_macro_dimensions
+from utils.cacti_runner import CactiRunner, shape_str
+from utils.cacti_retry import RetryStrategy
+from utils.cacti_config import cacti_temperature, CACTI_MIN_TEMPERATURE_K
+from concurrent.futures import ThreadPoolExecutor
+from utils.area import get_macro_dimensions, get_port_multiplier
+from utils.timings import Timings
+from utils.pin_plan import plan_pins
+
+################################################################################
+# CACTI INPUTS
+#
+# Return the parameters of an sram from the json configuration file that Cacti
+# actually sees (after banking). Two srams with the same Cacti inputs get the
+# same Cacti results, no matter their name, write mode or write granularity.
+# Returns None for processes that do not use Cacti. The last input is the
+# temperature Cacti runs at, 300K for the nominal corner.
+################################################################################
+
+def cacti_inputs( process, sram_data ):
+  if process.tech_nm == 7:
+    return None
+  width_in_bits = int(sram_data['width'])
+  depth         = int(sram_data['depth'])
+  num_banks     = int(sram_data['banks'])
+  if num_banks > 1 and num_banks % 2 == 0:
+    if str(sram_data.get('banking_technique', 'width')) == 'depth':
+      depth = math.ceil(depth / num_banks)
+    else:
+      width_in_bits = math.ceil(width_in_bits / num_banks)
+  width_in_bytes = math.ceil(width_in_bits / 8.0)
+  return ( width_in_bytes * depth, width_in_bytes
+         , int(sram_data['ports'].get('rw', 0)), int(sram_data['ports'].get('r', 0)), int(sram_data['ports'].get('w', 0))
+         , process.tech_um, str(sram_data['type']) if 'type' in sram_data else 'cache', CACTI_MIN_TEMPERATURE_K )
+
+# corner_cacti_inputs: corner name -> the cacti inputs of that corner of the
+# process, for an sram with the (nominal) cacti inputs cacti_key. Corners only
+# differ in the temperature cacti runs at, so several may share inputs.
+def corner_cacti_inputs( process, cacti_key ):
+  return { corner['name'] : tuple(cacti_key[:-1]) + (cacti_temperature(corner['temperature']),) for corner in process.corners }
+
+# cacti_work_dir: the directory the cacti runs for cacti_key are done in,
+# the results directory for the nominal temperature and a subdirectory per
+# temperature otherwise (so runs for several corners never share files).
+def cacti_work_dir( results_dir, cacti_key ):
+  if cacti_key[-1] == CACTI_MIN_TEMPERATURE_K:
+    return results_dir
+  work_dir = os.sep.join([results_dir, 'cacti_%dK' % cacti_key[-1]])
+  os.makedirs( work_dir, exist_ok=True )
+  return work_dir
+
+# results_dir_for: the directory the views of sram `name` are written to.
+def results_dir_for( output_dir, name ):
+  if output_dir: # Output dir was set by command line option
+    p = str(Path(output_dir).expanduser().resolve(strict=False))
+    return os.sep.join([p, name])
+  return os.sep.join([os.getcwd(), 'results', name])
+
+# retry_strategy: the cacti retry strategy configured for a process.
+def retry_strategy( process ):
+  return RetryStrategy(process.cacti_retry_strategy, process.cacti_retry_attempts, process.cacti_retry_parallel)
+
 ################################################################################
 # MEMORY CLASS
 #
@@ -16,9 +75,10 @@ from utils.area import get_macro_dimensions
 
 class Memory:
 
-  def __init__( self, process, sram_data , output_dir = None, cacti_dir = None):
+  def __init__( self, process, sram_data , output_dir = None, cacti_dir = None, cacti_cache = None, cacti_memo = None, timings = None, cacti_jobs = 1):
 
     self.process        = process
+    self.cacti_jobs     = cacti_jobs   ;# cacti processes this memory may run at once
     self.name           = str(sram_data['name'])
     self.width_in_bits  = int(sram_data['width'])
     self.depth          = int(sram_data['depth'])
@@ -52,13 +112,12 @@ class Memory:
 
     self.width_in_bytes = math.ceil(self.width_in_bits / 8.0)
     self.total_size     = self.width_in_bytes * self.depth
-    if output_dir: # Output dir was set by command line option
-      p = str(Path(output_dir).expanduser().resolve(strict=False))
-      self.results_dir = os.sep.join([p, self.name])
-    else:
-      self.results_dir = os.sep.join([os.getcwd(), 'results', self.name])
+    self.cacti_key      = ( self.total_size, self.width_in_bytes, self.rw_ports, self.r_ports, self.w_ports
+                          , process.tech_um, self.cache_type, CACTI_MIN_TEMPERATURE_K )
+    self.timings        = timings if timings else Timings()
+    self.results_dir    = results_dir_for(output_dir, self.name)
     if not os.path.exists( self.results_dir ):
-      os.makedirs( self.results_dir )
+      os.makedirs( self.results_dir, exist_ok=True )
     
     print(f'\n\n\n***************************Run for {self.name}***************************\n\n\n')
 
@@ -71,72 +130,62 @@ class Memory:
       self.fo4_ps = 9.0632
       self.height_um, self.width_um    = get_macro_dimensions(process, sram_data)
       
-      overall_mult = 1
-      wmask_mult = 0 if self.has_wmask == False else 0.045
-      # Height and Width Multiplier based on the amount of r, w, and rw ports, 
-      # ASSUMING there is more than 1 port
-      if int(sram_data['ports']['r']) + int(sram_data['ports']['rw']) + int(sram_data['ports']['w']) > 1:
-        r_port_mult = int(sram_data['ports']['r']) * 0.3
-        # Add wmask_mult to per-port multipliers for w and rw
-        w_port_mult = int(sram_data['ports']['w']) * (0.25 + wmask_mult)  
-        rw_port_mult = int(sram_data['ports']['rw']) * (0.4 + wmask_mult)
-        overall_mult = (1 + r_port_mult + w_port_mult + rw_port_mult)
-      self.height_um = self.height_um * (overall_mult + wmask_mult)
-      self.width_um = self.width_um * (overall_mult + wmask_mult)
+      # Height and Width Multiplier based on the amount of r, w, and rw ports
+      port_mult = get_port_multiplier(self.r_ports, self.w_ports, self.rw_ports, self.has_wmask)
+      self.height_um = self.height_um * port_mult
+      self.width_um = self.width_um * port_mult
       self.pin_dynamic_power_mW = 0.0013449
+      self.cacti_width_in_bits = self.width_in_bits
+      self.cacti_depth = self.depth
     else: 
-      if output_dir: # Output dir was set by command line option
-        p = str(Path(output_dir).expanduser().resolve(strict=False))
-        self.results_dir = os.sep.join([p, self.name])
-      else:
-        self.results_dir = os.sep.join([os.getcwd(), 'results', self.name])
-      if not os.path.exists( self.results_dir ):
-        os.makedirs( self.results_dir )
-      if cacti_dir:
-        self.cacti_dir = cacti_dir
-      else:
-        self.cacti_dir = os.environ['CACTI_BUILD_DIR']
-
-      # IF size is unavailable for tag org (cacti error), try to generate 
+      # IF size is unavailable for tag org (cacti error), cacti is retried with
       # as close to the same config that is configurable 
-      original_width_in_bits = self.width_in_bits
-      original_width_in_bytes = self.width_in_bytes
-      while True:
-        try:
-          self.__run_cacti()
-          with open( os.sep.join([self.results_dir, 'cacti.cfg.out']), 'r' ) as fid:
-            lines = [line for line in fid]
-            cacti_data = lines[-1].split(',')
-          self.tech_node_nm                = int(cacti_data[0])
-          self.associativity               = int(cacti_data[2])
-          self.access_time_ns              = float(cacti_data[4])
-          self.cycle_time_ns               = float(cacti_data[5])
-          self.pin_dynamic_power_mW        = float(cacti_data[8])
-          self.standby_leakage_per_bank_mW = float(cacti_data[9])
-          self.fo4_ps                      = float(cacti_data[11])
-          self.width_um                    = float(cacti_data[12])
-          self.height_um                   = float(cacti_data[13])
-        except FileNotFoundError:
-          # IF no size within reason is available, terminate as usual
-          print(f"Byte width of {self.width_in_bytes} doesn't work with cacti. Attempting again with different values.")
-          self.width_in_bits = self.width_in_bits + 8
-          self.width_in_bytes = math.ceil(self.width_in_bits / 8.0)
-          self.total_size     = self.width_in_bytes * self.depth
-          # Raise the same error, as the config doesn't work even within reason
-          if self.width_in_bits >= original_width_in_bits + (8 * 2):
-            raise
-        else:
-          break
-      # Revert the width values back for correct pin count (also try to size width of physical macro according to OG size)
-      if self.width_in_bits != original_width_in_bits:
-        self.width_um = self.width_um * original_width_in_bits / self.width_in_bits
+      corner_keys = corner_cacti_inputs(process, self.cacti_key)
+      results = self.characterize([self.cacti_key] + list(corner_keys.values()), cacti_dir, cacti_cache, cacti_memo)
+      cacti_data, used_cacti_key = results[self.cacti_key]
+      # The geometry cacti actually characterized (differs from the sram when
+      # cacti had to substitute a shape it could build)
+      self.cacti_width_in_bits = self.width_in_bits + 8 * (used_cacti_key[1] - self.width_in_bytes)
+      self.cacti_depth         = used_cacti_key[0] // used_cacti_key[1]
+      self.tech_node_nm                = int(cacti_data[0])
+      self.associativity               = int(cacti_data[2])
+      self.access_time_ns              = float(cacti_data[4])
+      self.cycle_time_ns               = float(cacti_data[5])
+      self.pin_dynamic_power_mW        = float(cacti_data[8])
+      self.standby_leakage_per_bank_mW = float(cacti_data[9])
+      self.fo4_ps                      = float(cacti_data[11])
+      self.width_um                    = float(cacti_data[12])
+      self.height_um                   = float(cacti_data[13])
+      # Scale the physical macro from the substitute shape back to the original
+      # size (the pin count always follows the original width)
+      if self.cacti_width_in_bits != self.width_in_bits or self.cacti_depth != self.depth:
+        self.width_um = self.width_um * self.width_in_bits / self.cacti_width_in_bits
+        self.height_um = self.height_um * self.depth / self.cacti_depth
         print("\n\n\n*********************INFO******************************\n\n\n")
-        print(f"Re-calculating width using ratio of original width in bits ({original_width_in_bits}) to the width in bits fed to cacti ({self.width_in_bits})")
-        self.width_in_bits = original_width_in_bits
-        self.width_in_bytes = original_width_in_bytes
+        print(f"Cacti characterized {self.name} as {shape_str(used_cacti_key)} instead of {shape_str(self.cacti_key)}")
+        print(f"Re-calculating size using ratio of original width in bits ({self.width_in_bits}) to the width in bits fed to cacti ({self.cacti_width_in_bits}) and of original depth ({self.depth}) to the depth fed to cacti ({self.cacti_depth})")
+
+    # Timing and power at every extra operating corner. Cacti has no supply
+    # voltage input, so the dynamic power is scaled by (V/Vnom)^2 here.
+    self.corners = []
+    for corner in process.corners:
+      corner = dict(corner)
+      if process.tech_nm == 7:
+        corner['access_time_ns']              = self.access_time_ns
+        corner['cycle_time_ns']               = self.cycle_time_ns
+        corner['pin_dynamic_power_mW']        = self.pin_dynamic_power_mW
+        corner['standby_leakage_per_bank_mW'] = self.standby_leakage_per_bank_mW
+        corner['fo4_ps']                      = self.fo4_ps
+      else:
+        corner_data = results[corner_keys[corner['name']]][0]
+        corner['access_time_ns']              = float(corner_data[4])
+        corner['cycle_time_ns']               = float(corner_data[5])
+        corner['pin_dynamic_power_mW']        = float(corner_data[8])
+        corner['standby_leakage_per_bank_mW'] = float(corner_data[9])
+        corner['fo4_ps']                      = float(corner_data[11])
+      corner['pin_dynamic_power_mW'] *= (corner['voltage'] / float(process.voltage))**2
+      self.corners.append(corner)
 
-      
-    
     self.cap_input_pf = 0.005
 
     self.tech_node_um = self.tech_node_nm / 1000.0
@@ -146,6 +195,14 @@ class Memory:
     # Adjust to snap
     self.width_um = (math.ceil((self.width_um*1000.0)/self.process.snapWidth_nm)*self.process.snapWidth_nm)/1000.0
     self.height_um = (math.ceil((self.height_um*1000.0)/self.process.snapHeight_nm)*self.process.snapHeight_nm)/1000.0
+
+    # Split the signal pins around the macro (an automatic plan may grow it)
+    self.pin_plan = plan_pins(self)
+    if (self.pin_plan.width_um, self.pin_plan.height_um) != (self.width_um, self.height_um):
+      print(f'Grew {self.name} from {self.width_um:.3f} x {self.height_um:.3f} to {self.pin_plan.width_um:.3f} x {self.pin_plan.height_um:.3f} to fit its pins')
+      self.width_um, self.height_um = self.pin_plan.width_um, self.pin_plan.height_um
+    if self.pin_plan.rebalanced:
+      print(f'Moved pins of {self.name} off full sides of the macro')
     self.area_um2 = self.width_um * self.height_um
 
     #self.pin_dynamic_power_mW = (0.5 * self.cap_input_pf * (float(self.process.voltage)**2))*1e9 ;# P = 0.5*CV^2
@@ -153,24 +210,40 @@ class Memory:
     self.t_setup_ns = 0.050  ;# arbitrary 50ps setup
     self.t_hold_ns  = 0.050  ;# arbitrary 50ps hold
 
-  # __run_cacti: shell out to cacti to generate a csv file with more data
-  # regarding this memory based on the input parameters from the json
-  # configuration file.
-  def __run_cacti( self ):
-    # For different port configurations, configure CACTI appropriately
-    rw_ports = self.rw_ports
-    r_ports = self.r_ports if hasattr(self, 'r_ports') else 0
-    w_ports = self.w_ports if hasattr(self, 'w_ports') else 0
-    
-    fid = open(os.sep.join([self.results_dir,'cacti.cfg']), 'w')
-    fid.write( cacti_config.format( self.total_size
-             , self.width_in_bytes, rw_ports, r_ports, w_ports
-             , self.process.tech_um, self.width_in_bytes*8, self.num_banks
-             , self.cache_type ))
-    fid.close()
-    odir = os.getcwd()
-    os.chdir(self.cacti_dir )
-    cmd = os.sep.join(['.','cacti -infile ']) + os.sep.join([self.results_dir,'cacti.cfg'])
-    os.system( cmd)
-    os.chdir(odir)
+  # characterize: the cacti results (csv row, cacti inputs cacti ran with) for
+  # each of the distinct tuples of cacti inputs in keys. Results already in
+  # cacti_memo are reused, the remaining keys are characterized side by side
+  # (each in its own work directory, see cacti_work_dir) and are added to
+  # cacti_memo. At most cacti_jobs cacti processes (corners and retry
+  # substitutes alike) are in flight at once (see CactiRunner).
+  def characterize( self, keys, cacti_dir, cacti_cache, cacti_memo ):
+    results = {}
+    pending = []
+    for key in dict.fromkeys(keys):
+      if cacti_memo is not None and key in cacti_memo:
+        # An sram with the same cacti inputs already ran, reuse its result
+        print(f'Reusing cacti results with identical inputs for {self.__label(key)}')
+        results[key] = cacti_memo[key]
+      else:
+        pending.append(key)
+    if not pending:
+      return results
+    if cacti_dir:
+      self.cacti_dir = cacti_dir
+    else:
+      self.cacti_dir = os.environ['CACTI_BUILD_DIR']
+    self.cacti_runner = CactiRunner(self.cacti_dir, cacti_cache, retry_strategy(self.process), self.timings, self.name, self.cacti_jobs)
+    with ThreadPoolExecutor(max_workers=min(len(pending), self.cacti_runner.jobs)) as pool:
+      runs = list(pool.map(lambda key: self.cacti_runner.characterize(key, cacti_work_dir(self.results_dir, key)), pending))
+    for key, (result, used_cacti_key) in zip(pending, runs):
+      if result.cached:
+        print(f'Using cached cacti results for {self.__label(key)}')
+      results[key] = (result.row, used_cacti_key)
+      if cacti_memo is not None:
+        cacti_memo[key] = results[key]
+    return results
 
+  def __label( self, cacti_key ):
+    if cacti_key[-1] == CACTI_MIN_TEMPERATURE_K:
+      return self.name
+    return '%s at %dK' % (self.name, cacti_key[-1])
@@ -1,3 +1,5 @@
+from utils.pin_plan import PIN_PLANS
+
 ################################################################################
 # PROCESS CLASS
 #
@@ -47,9 +49,48 @@ class Process:
     self.snapWidth_nm   = int(json_data['snapWidth_nm']) if 'snapWidth_nm' in json_data else 1
     self.snapHeight_nm  = int(json_data['snapHeight_nm']) if 'snapHeight_nm' in json_data else 1
     self.flipPins       = str(json_data['flipPins']) if 'flipPins' in json_data else 'false'
+    self.nldm_table_size = int(json_data['nldm_table_size']) if 'nldm_table_size' in json_data else 2
+    if self.nldm_table_size < 2:
+      raise Exception("nldm_table_size must be at least 2, got {}".format(self.nldm_table_size))
     
+    # 'fixed' pin sides, or 'auto' to move pins and grow the macro when a side
+    # runs out of tracks (see pin_plan)
+    self.pin_plan = str(json_data['pin_plan']) if 'pin_plan' in json_data else 'fixed'
+    if self.pin_plan not in PIN_PLANS:
+      raise Exception("Unsupported pin_plan '{}', use either 'fixed' or 'auto' ('fixed' is DEFAULT)".format(self.pin_plan))
+
+    # Layers of VDD/VSS straps (a list, or one object for a single layer). By
+    # default one layer of straps on metal 4 (horizontal, vertical if flipPins)
+    # 8 supply pin pitches apart and 4 supply pin widths wide. Without an
+    # offset the first strap is 6 pin pitches from the edge, max_straps caps
+    # the straps of a layer (see lef_geometry).
+    power_straps = json_data.get('power_straps', [{}])
+    self.power_straps = []
+    for straps in ([power_straps] if isinstance(power_straps, dict) else power_straps):
+      self.power_straps.append({ 'layer'      : str(straps.get('layer', '%s4' % self.metalPrefix))
+                               , 'direction'  : str(straps.get('direction', 'vertical' if self.flipPins.lower() == 'true' else 'horizontal'))
+                               , 'width_um'   : int(straps['width_nm']) / 1000.0 if 'width_nm' in straps else self.PSwidth_um*4
+                               , 'pitch_um'   : int(straps['pitch_nm']) / 1000.0 if 'pitch_nm' in straps else self.PSpitch_um*8
+                               , 'offset_um'  : int(straps['offset_nm']) / 1000.0 if 'offset_nm' in straps else None
+                               , 'max_straps' : int(straps['max_straps']) if 'max_straps' in straps else None })
+
     self.vlogTimingCheckSignalExpansion = bool(json_data['vlogTimingCheckSignalExpansion']) if 'vlogTimingCheckSignalExpansion' in json_data else False
 
+    # How to search for a substitute shape when cacti cannot build an sram
+    cacti_retry = json_data.get('cacti_retry', {})
+    self.cacti_retry_strategy = str(cacti_retry.get('strategy', 'linear'))
+    self.cacti_retry_attempts = int(cacti_retry.get('max_attempts', 8))
+    self.cacti_retry_parallel = int(cacti_retry.get('parallel', 4))
+
+    # Extra operating corners a .lib is written for next to the nominal one
+    # (temperature in C, voltage defaults to the nominal voltage)
+    self.corners = []
+    for corner in json_data.get('corners', []):
+      self.corners.append({ 'name'        : str(corner['name'])
+                          , 'process'     : float(corner.get('process', 1))
+                          , 'voltage'     : float(corner.get('voltage', self.voltage))
+                          , 'temperature' : float(corner.get('temperature', 25)) })
+
     # Converted values
     self.tech_um     = self.tech_nm / 1000.0
     
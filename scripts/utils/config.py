@@ -0,0 +1,328 @@
+import os
+import json
+import itertools
+from utils.pin_plan import PIN_PLANS
+
+################################################################################
+# CONFIG LOADER
+#
+# Reads the JSON configuration file (JSON where every line starting with # is a
+# comment) and checks the whole of it before anything expensive runs: the
+# process keys (per tech_nm), the corners and every sram. All problems found
+# are reported together in one ConfigError, with the sram they belong to.
+#
+# A configuration can "include" other configuration files (a path or a list of
+# paths, relative to the including file), e.g. a shared process block. The
+# keys of the including file win, except for the "srams" and "sram_templates"
+# lists which are concatenated (included files first).
+#
+# Besides the "srams" list, "sram_templates" describe families of srams. A
+# template is an sram entry where any key except the name may hold a list of
+# values; it expands to one sram per combination of them (in the order of the
+# keys). The name is formatted with the values of the sram, and {ports} is the
+# port profile (e.g. 1rw or 2r1w):
+#
+#   { "name": "fakeram_{width}x{depth}_{ports}", "width": [32, 64],
+#     "depth": [256, 512], "banks": 1, "ports": [{"rw": 1}, {"r": 1, "w": 1}] }
+#
+# iter_srams yields the srams of the templates one at a time, but the whole
+# configuration is expanded up front: validate_config checks every sram before
+# anything runs, and run.py lists and groups them before generating any.
+################################################################################
+
+class ConfigError(Exception):
+  pass
+
+PORT_KINDS        = ('r', 'w', 'rw')
+BANKING_TECHNIQUE = ('width', 'depth')
+WRITE_MODES       = ('write_first', 'read_first', 'write_through')
+RETRY_STRATEGIES  = ('search', 'linear')
+STRAP_DIRECTIONS  = ('horizontal', 'vertical')
+
+# Lists that included files add to rather than replace
+CONCATENATED_KEYS = ('srams', 'sram_templates')
+
+# load_config: parse (following includes) and validate the configuration file
+# at path. Without need_srams no srams are required (sweeps bring their own).
+def load_config( path, need_srams = True ):
+  json_data = read_config( path )
+  problems = validate_config(json_data, need_srams)
+  if problems:
+    raise ConfigError(f'{path}: {len(problems)} problems\n  ' + '\n  '.join(problems))
+  return json_data
+
+# read_config: the parsed configuration file at path, with its includes merged
+# in. including is the chain of files that included it (to catch cycles).
+def read_config( path, including = () ):
+  with open(path, 'r') as fid:
+    # Comment lines are blanked rather than dropped so json errors point at the
+    # right line of the file
+    text = ''.join('\n' if line.strip().startswith('#') else line for line in fid)
+  try:
+    json_data = json.loads(text)
+  except ValueError as e:
+    raise ConfigError(f'{path}: {e}')
+  if not isinstance(json_data, dict):
+    raise ConfigError(f'{path}: the configuration must be a json object')
+
+  includes = json_data.pop('include', [])
+  if isinstance(includes, str):
+    includes = [includes]
+  if not isinstance(includes, list):
+    raise ConfigError(f'{path}: include must be a path or a list of paths, got {includes!r}')
+  merged = {}
+  for include in includes:
+    include_path = os.path.join(os.path.dirname(path), str(include))
+    if os.path.realpath(include_path) in including + (os.path.realpath(path),):
+      raise ConfigError(f'{path}: {include} includes itself')
+    merge_config( merged, read_config(include_path, including + (os.path.realpath(path),)) )
+  merge_config( merged, json_data )
+  return merged
+
+def merge_config( merged, json_data ):
+  for key, value in json_data.items():
+    if key in CONCATENATED_KEYS and isinstance(merged.get(key), list) and isinstance(value, list):
+      merged[key] = merged[key] + value
+    else:
+      merged[key] = value
+
+# iter_srams: every sram of the configuration, the "srams" list first and then
+# the expansion of every template.
+def iter_srams( json_data ):
+  for sram_data in json_data.get('srams', []):
+    yield sram_data
+  for template in json_data.get('sram_templates', []):
+    for sram_data in expand_template(template):
+      yield sram_data
+
+# expand_template: the srams of one template (see above).
+def expand_template( template ):
+  axes = [ key for key, value in template.items() if key != 'name' and isinstance(value, list) ]
+  for values in itertools.product(*[template[key] for key in axes]):
+    sram_data = dict(template)
+    sram_data.update(zip(axes, values))
+    fields = dict(sram_data)
+    if isinstance(sram_data.get('ports'), dict):
+      fields['ports'] = ports_label(sram_data['ports'])
+    try:
+      sram_data['name'] = str(template['name']).format(**fields)
+    except (KeyError, IndexError, ValueError) as e:
+      raise ConfigError(f'sram template {template.get("name")}: cannot format the name ({e!r})')
+    yield sram_data
+
+# ports_label: short name of a port profile, e.g. 1rw or 2r1w.
+def ports_label( ports ):
+  return ''.join('%s%s' % (ports[kind], kind) for kind in ('rw', 'r', 'w') if ports.get(kind, 0))
+
+# validate_config: the list of problems with the parsed configuration.
+def validate_config( json_data, need_srams = True ):
+  problems = []
+  if not isinstance(json_data, dict):
+    return ['the configuration must be a json object']
+  check = Checker(json_data, '', problems)
+
+  # Process
+  tech_nm = check.integer('tech_nm', minimum=1)
+  check.string('metalPrefix')
+  check.number('voltage', minimum=0)
+  # The power pin pitch/width (the default strap pitch/width, see class_process)
+  ps_nm = {}
+  for kind in ('Pitch', 'Width'):
+    if f'pin{kind}_nm' in json_data:
+      ps_nm[kind] = check.integer(f'pin{kind}_nm', minimum=1)
+    else:
+      check.integer(f'TBpin{kind}_nm', minimum=1)
+      ps_nm[kind] = check.integer(f'LRpin{kind}_nm', minimum=1)
+    ps = check.integer(f'PSpin{kind}_nm', minimum=1, required=False)
+    if ps is not None and f'pin{kind}_nm' not in json_data:
+      ps_nm[kind] = ps
+  for key in ('pinHeight_nm', 'TBpinHeight_nm', 'LRpinHeight_nm', 'snapWidth_nm', 'snapHeight_nm'):
+    check.integer(key, minimum=1, required=False)
+  check.integer('nldm_table_size', minimum=2, required=False)
+  check.choice('pin_plan', PIN_PLANS, required=False)
+  if tech_nm == 7:
+    for key in ('fin_pitch_nm', 'contacted_poly_pitch_nm', 'column_mux_factor'):
+      check.integer(key, minimum=1)
+
+  cacti_retry = check.json_object('cacti_retry', required=False)
+  if cacti_retry is not None:
+    retry = Checker(cacti_retry, 'cacti_retry: ', problems)
+    retry.choice('strategy', RETRY_STRATEGIES, required=False)
+    retry.integer('max_attempts', minimum=0, required=False)
+    retry.integer('parallel', minimum=1, required=False)
+
+  power_straps = json_data.get('power_straps')
+  if isinstance(power_straps, dict):
+    power_straps = [power_straps]
+  if power_straps is not None and (not isinstance(power_straps, list) or not power_straps):
+    problems.append(f'power_straps must be a json object or a non-empty list of them, got {json_data["power_straps"]!r}')
+    power_straps = None
+  for i, straps_data in enumerate(power_straps or []):
+    if not isinstance(straps_data, dict):
+      problems.append(f'power_straps[{i}]: must be a json object')
+      continue
+    straps = Checker(straps_data, f'power_straps[{i}]: ', problems)
+    straps.string('layer', required=False)
+    straps.choice('direction', STRAP_DIRECTIONS, required=False)
+    width = straps.integer('width_nm', minimum=1, required=False)
+    pitch = straps.integer('pitch_nm', minimum=1, required=False)
+    # VSS and VDD straps are pitch apart, a strap as wide shorts them
+    if width is None and 'width_nm' not in straps_data and ps_nm['Width'] is not None:
+      width = ps_nm['Width'] * 4
+    if pitch is None and 'pitch_nm' not in straps_data and ps_nm['Pitch'] is not None:
+      pitch = ps_nm['Pitch'] * 8
+    if width is not None and pitch is not None and width >= pitch:
+      problems.append(f'power_straps[{i}]: width_nm ({width}) must be less than pitch_nm ({pitch})')
+    straps.integer('offset_nm', minimum=0, required=False)
+    straps.integer('max_straps', minimum=2, required=False)
+
+  corners = check.json_list('corners', required=False)
+  names = set()
+  for i, corner_data in enumerate(corners or []):
+    if not isinstance(corner_data, dict):
+      problems.append(f'corners[{i}]: must be a json object')
+      continue
+    corner = Checker(corner_data, f'corners[{i}]: ', problems)
+    name = corner.string('name')
+    if name is not None and name in names:
+      problems.append(f'corners[{i}]: corner name {name} is used twice')
+    names.add(name)
+    corner.number('process', minimum=0, required=False)
+    corner.number('voltage', minimum=0, required=False)
+    corner.number('temperature', required=False)
+
+  # Srams (templates are checked through the srams they expand to)
+  before = len(problems)
+  srams = check.json_list('srams', required=False)
+  templates = check.json_list('sram_templates', required=False)
+  if need_srams and not srams and not templates:
+    problems.append('no srams to generate (need srams or sram_templates)')
+  for i, template in enumerate(templates or []):
+    if not isinstance(template, dict) or not isinstance(template.get('name'), str):
+      problems.append(f'sram_templates[{i}]: must be a json object with a name')
+      continue
+    for key, value in template.items():
+      if isinstance(value, list) and not value:
+        problems.append(f'sram_templates[{i}] ({template["name"]}): {key} has no values')
+  if len(problems) > before:
+    return problems
+  names = set()
+  try:
+    for i, sram_data in enumerate(iter_srams(json_data)):
+      if not isinstance(sram_data, dict):
+        problems.append(f'srams[{i}]: must be a json object')
+        continue
+      name = sram_data.get('name')
+      sram = Checker(sram_data, f'srams[{i}] ({name}): ' if isinstance(name, str) else f'srams[{i}]: ', problems)
+      name = sram.string('name')
+      if name is not None and name in names:
+        problems.append(f'{sram.where}sram name {name} is used twice')
+      names.add(name)
+      width = sram.integer('width', minimum=1)
+      sram.integer('depth', minimum=1)
+      sram.integer('banks', minimum=1)
+      sram.choice('banking_technique', BANKING_TECHNIQUE, required=False)
+      sram.choice('write_mode', WRITE_MODES, required=False)
+      sram.string('type', required=False)
+      granularity = sram.integer('write_granularity', minimum=1, required=False)
+      if width is not None and granularity is not None and width % granularity != 0:
+        problems.append(f'{sram.where}write_granularity {granularity} does not divide the width {width}')
+      ports = sram.json_object('ports')
+      if ports is not None:
+        for kind in ports:
+          if kind not in PORT_KINDS:
+            problems.append(f'{sram.where}unknown port kind {kind!r} (use {", ".join(PORT_KINDS)})')
+        counts = [ Checker(ports, f'{sram.where}ports: ', problems).integer(kind, minimum=0, required=False) for kind in PORT_KINDS ]
+        if all(kind not in ports or count is not None for kind, count in zip(PORT_KINDS, counts)) and sum(count or 0 for count in counts) == 0:
+          problems.append(f'{sram.where}ports: the sram has no ports')
+  except ConfigError as e:
+    problems.append(str(e))
+  return problems
+
+# Checker: checks the values of the keys of one json object, adding a problem
+# (prefixed with where) for every key that is missing or malformed. The check
+# functions return the value, or None if it is missing or malformed.
+class Checker:
+
+  def __init__( self, data, where, problems ):
+    self.data     = data
+    self.where    = where
+    self.problems = problems
+
+  def __get( self, key, required ):
+    if key not in self.data:
+      if required:
+        self.problems.append(f'{self.where}missing required key {key}')
+      return None, False
+    return self.data[key], True
+
+  def __bad( self, key, value, what ):
+    self.problems.append(f'{self.where}{key} must be {what}, got {value!r}')
+
+  def integer( self, key, minimum = None, required = True ):
+    value, present = self.__get(key, required)
+    if not present:
+      return None
+    try:
+      number = int(value)
+    except (TypeError, ValueError):
+      number = None
+    if number is None or isinstance(value, bool) or (isinstance(value, float) and value != number):
+      self.__bad(key, value, 'an integer')
+      return None
+    if minimum is not None and number < minimum:
+      self.__bad(key, value, f'at least {minimum}')
+      return None
+    return number
+
+  def number( self, key, minimum = None, required = True ):
+    value, present = self.__get(key, required)
+    if not present:
+      return None
+    try:
+      number = float(value)
+    except (TypeError, ValueError):
+      number = None
+    if number is None or isinstance(value, bool):
+      self.__bad(key, value, 'a number')
+      return None
+    if minimum is not None and number < minimum:
+      self.__bad(key, value, f'at least {minimum}')
+      return None
+    return number
+
+  def string( self, key, required = True ):
+    value, present = self.__get(key, required)
+    if not present:
+      return None
+    if not isinstance(value, str) or not value:
+      self.__bad(key, value, 'a non-empty string')
+      return None
+    return value
+
+  def choice( self, key, choices, required = True ):
+    value, present = self.__get(key, required)
+    if not present:
+      return None
+    if value not in choices:
+      self.__bad(key, value, 'one of ' + ', '.join(choices))
+      return None
+    return value
+
+  def json_object( self, key, required = True ):
+    value, present = self.__get(key, required)
+    if not present:
+      return None
+    if not isinstance(value, dict):
+      self.__bad(key, value, 'a json object')
+      return None
+    return value
+
+  def json_list( self, key, required = True ):
+    value, present = self.__get(key, required)
+    if not present:
+      return None
+    if not isinstance(value, list):
+      self.__bad(key, value, 'a list')
+      return None
+    return value
@@ -2,14 +2,413 @@ import os
 import math
 import time
 import datetime
+from utils.manifest import write_if_changed
 
 ################################################################################
 # GENERATE LIBERTY VIEW
 #
 # Generate a .lib file based on the given SRAM.
+#
+# The view is built from the fragments below. Values shared by the whole
+# memory (%(name)s, %(tsetup)s, ...) are filled in once per memory, which
+# leaves a block per kind of pin that only needs the port (%(port)s, e.g. rw0)
+# filled in for every port. Everything is joined into one string and written
+# out with a single write.
+################################################################################
+
+LIB_HEADER = '''\
+library(%(library)s) {
+    technology (cmos);
+    delay_model : table_lookup;
+    revision : 1.0;
+    date : "%(date)s %(current_time)s";
+    comment : "%(comment)s";
+    time_unit : "1ns";
+    voltage_unit : "1V";
+    current_unit : "1uA";
+    leakage_power_unit : "1uW";
+    nom_process : %(process)s;
+    nom_temperature : %(temperature)s;
+    nom_voltage : %(voltage)s;
+    capacitive_load_unit (1,pf);
+
+    pulling_resistance_unit : "1kohm";
+
+    operating_conditions(%(conditions)s) {
+        process : %(process)s;
+        temperature : %(temperature)s;
+        voltage : %(voltage)s;
+        tree_type : balanced_tree;
+    }
+
+    /* default attributes */
+    default_cell_leakage_power : 0;
+    default_fanout_load : 1;
+    default_inout_pin_cap : 0.0;
+    default_input_pin_cap : 0.0;
+    default_output_pin_cap : 0.0;
+    default_input_pin_cap : 0.0;
+    default_max_transition : %(max_slew)s;
+
+    default_operating_conditions : %(conditions)s;
+    default_leakage_power_density : 0.0;
+
+    /* additional header data */
+    slew_derate_from_library : 1.000;
+    slew_lower_threshold_pct_fall : 20.000;
+    slew_upper_threshold_pct_fall : 80.000;
+    slew_lower_threshold_pct_rise : 20.000;
+    slew_upper_threshold_pct_rise : 80.000;
+    input_threshold_pct_fall : 50.000;
+    input_threshold_pct_rise : 50.000;
+    output_threshold_pct_fall : 50.000;
+    output_threshold_pct_rise : 50.000;
+
+
+    lu_table_template(%(templates)s_mem_out_delay_template) {
+        variable_1 : input_net_transition;
+        variable_2 : total_output_net_capacitance;
+            index_1 ("%(template_indicies)s");
+            index_2 ("%(template_indicies)s");
+    }
+    lu_table_template(%(templates)s_mem_out_slew_template) {
+        variable_1 : total_output_net_capacitance;
+            index_1 ("%(template_indicies)s");
+    }
+    lu_table_template(%(templates)s_constraint_template) {
+        variable_1 : related_pin_transition;
+        variable_2 : constrained_pin_transition;
+            index_1 ("%(template_indicies)s");
+            index_2 ("%(template_indicies)s");
+    }
+    power_lut_template(%(templates)s_energy_template_clkslew) {
+        variable_1 : input_transition_time;
+            index_1 ("%(template_indicies)s");
+    }
+    power_lut_template(%(templates)s_energy_template_sigslew) {
+        variable_1 : input_transition_time;
+            index_1 ("%(template_indicies)s");
+    }
+    library_features(report_delay_calculation);
+'''
+
+LIB_TYPES = '''\
+    type (%(name)s_DATA) {
+        base_type : array ;
+        data_type : bit ;
+        bit_width : %(bits)s;
+        bit_from : %(bits_m1)s;
+        bit_to : 0 ;
+        downto : true ;
+    }
+    type (%(name)s_ADDRESS) {
+        base_type : array ;
+        data_type : bit ;
+        bit_width : %(addr_width)s;
+        bit_from : %(addr_width_m1)s;
+        bit_to : 0 ;
+        downto : true ;
+    }
+'''
+
+LIB_WMASK_TYPE = '''\
+    type (%(name)s_WMASK) {
+        base_type : array ;
+        data_type : bit ;
+        bit_width : %(wmask_width)s;
+        bit_from : %(wmask_width_m1)s;
+        bit_to : 0 ;
+        downto : true ;
+    }
+'''
+
+LIB_CELL = '''\
+cell(%(name)s) {
+    area : %(area)s;
+    interface_timing : true;
+    memory() {
+        type : ram;
+        address_width : %(addr_width)s;
+        word_width : %(bits)s;
+    }
+'''
+
+LIB_CELL_FOOTER = '''\
+    cell_leakage_power : %(leakage)s;
+}
+'''
+
+LIB_FOOTER = '''\
+
+}
+'''
+
+# Setup and hold arcs of an input pin to the clock of its port
+LIB_SETUP_HOLD = '''\
+        timing() {
+            related_pin : %%(port)s_clk;
+            timing_type : setup_rising ;
+            rise_constraint(%(templates)s_constraint_template) {
+                index_1 ("%(slew_indicies)s");
+                index_2 ("%(slew_indicies)s");
+                values ( \\
+%(tsetup_table)s \\
+                )
+            }
+            fall_constraint(%(templates)s_constraint_template) {
+                index_1 ("%(slew_indicies)s");
+                index_2 ("%(slew_indicies)s");
+                values ( \\
+%(tsetup_table)s \\
+                )
+            }
+        } 
+        timing() {
+            related_pin : %%(port)s_clk;
+            timing_type : hold_rising ;
+            rise_constraint(%(templates)s_constraint_template) {
+                index_1 ("%(slew_indicies)s");
+                index_2 ("%(slew_indicies)s");
+                values ( \\
+%(thold_table)s \\
+                )
+            }
+            fall_constraint(%(templates)s_constraint_template) {
+                index_1 ("%(slew_indicies)s");
+                index_2 ("%(slew_indicies)s");
+                values ( \\
+%(thold_table)s \\
+                )
+            }
+        }
+'''
+
+LIB_SIGNAL_POWER = '''\
+        internal_power(){
+            rise_power(%(templates)s_energy_template_sigslew) {
+                index_1 ("%(slew_indicies)s");
+                values ("%(pindynamic_table)s")
+            }
+            fall_power(%(templates)s_energy_template_sigslew) {
+                index_1 ("%(slew_indicies)s");
+                values ("%(pindynamic_table)s")
+            }
+        }
+'''
+
+LIB_CLK_PIN = '''\
+    pin(%%(port)s_clk)   {
+        direction : input;
+        capacitance : %(clk_cap)s;
+        clock : true;
+        min_period           : %(min_period)s ;
+        internal_power(){
+            rise_power(%(templates)s_energy_template_clkslew) {
+                index_1 ("%(slew_indicies)s");
+                values ("%(clkpindynamic_table)s")
+            }
+            fall_power(%(templates)s_energy_template_clkslew) {
+                index_1 ("%(slew_indicies)s");
+                values ("%(clkpindynamic_table)s")
+            }
+        }
+    }
+
+'''
+
+LIB_RD_OUT_BUS = '''\
+    bus(%%(port)s_rd_out)   {
+        bus_type : %(name)s_DATA;
+        direction : output;
+        max_capacitance : %(max_load)s;
+        memory_read() {
+            address : %%(port)s_addr_in;
+        }
+        timing() {
+            related_pin : "%%(port)s_clk" ;
+            timing_type : rising_edge;
+            timing_sense : non_unate;
+            cell_rise(%(templates)s_mem_out_delay_template) {
+                index_1 ("%(slew_indicies)s");
+                index_2 ("%(load_indicies)s");
+                values ( \\
+%(tcq_table)s \\
+                )
+            }
+            cell_fall(%(templates)s_mem_out_delay_template) {
+                index_1 ("%(slew_indicies)s");
+                index_2 ("%(load_indicies)s");
+                values ( \\
+%(tcq_table)s \\
+                )
+            }
+            rise_transition(%(templates)s_mem_out_slew_template) {
+                index_1 ("%(load_indicies)s");
+                values ("%(out_slew_table)s")
+            }
+            fall_transition(%(templates)s_mem_out_slew_template) {
+                index_1 ("%(load_indicies)s");
+                values ("%(out_slew_table)s")
+            }
+        }
+    }
+'''
+
+LIB_WE_IN_PIN = '''\
+    pin(%%(port)s_we_in)   {
+        direction : input;
+        capacitance : %(min_driver_in_cap)s;
+''' + LIB_SETUP_HOLD + LIB_SIGNAL_POWER + '''\
+    }
+'''
+
+LIB_CE_IN_PIN = LIB_WE_IN_PIN.replace('_we_in)', '_ce_in)')
+
+LIB_ADDR_IN_BUS = '''\
+    bus(%%(port)s_addr_in)   {
+        bus_type : %(name)s_ADDRESS;
+        direction : input;
+        capacitance : %(min_driver_in_cap)s;
+''' + LIB_SETUP_HOLD + LIB_SIGNAL_POWER + '''\
+    }
+'''
+
+# Write data (and write mask) busses are written on the port clock, with the
+# internal power split on the write enable
+LIB_WD_IN_BUS = '''\
+    bus(%%(port)s_wd_in)   {
+        bus_type : %(name)s_DATA;
+        memory_write() {
+            address : %%(port)s_addr_in;
+            clocked_on : "%%(port)s_clk";
+        }
+        direction : input;
+        capacitance : %(min_driver_in_cap)s;
+''' + LIB_SETUP_HOLD.replace('related_pin :', 'related_pin     :').replace('timing_type :', 'timing_type     :') \
+    + LIB_SIGNAL_POWER.replace('internal_power(){\n', 'internal_power(){\n            when : "(! (%%(port)s_we_in) )";\n') \
+    + LIB_SIGNAL_POWER.replace('internal_power(){\n', 'internal_power(){\n            when : "(%%(port)s_we_in)";\n') + '''\
+    }
+'''
+
+LIB_WMASK_IN_BUS = LIB_WD_IN_BUS.replace('_wd_in)', '_wmask_in)').replace('_DATA;', '_WMASK;')
+
+# Per port blocks, in the order they appear in the cell: the block, the port
+# kinds it is written for and whether it only exists with a write mask.
+LIB_PORT_BLOCKS = [ (LIB_CLK_PIN,      ('r', 'w', 'rw'), False)
+                  , (LIB_RD_OUT_BUS,   ('rw', 'r'),      False)
+                  , (LIB_WE_IN_PIN,    ('rw', 'w'),      False)
+                  , (LIB_CE_IN_PIN,    ('rw', 'r', 'w'), False)
+                  , (LIB_ADDR_IN_BUS,  ('rw',),          False)
+                  , (LIB_WD_IN_BUS,    ('rw', 'w'),      False)
+                  , (LIB_WMASK_IN_BUS, ('rw', 'w'),      True)
+                  , (LIB_ADDR_IN_BUS,  ('r', 'w'),       False) ]
+
+################################################################################
+# NLDM TABLES
+#
+# With the default table size of 2 every table holds the single value cacti
+# gives (flat tables, the tools see no slew or load dependence). Larger tables
+# are filled in from a first order model around the cacti values:
+#
+#   - the output driver is sized to drive max_load at a fanout of 4, so each
+#     max_load of output load adds one fo4 of clk->q delay and the output
+#     transition is the 20-80% RC rise of that driver (RC * ln 4)
+#   - a slower input transition delays the switching point of the receiving
+#     gate by (1/2 - Vt/Vdd) of the transition (Vt/Vdd ~ 0.3)
+#   - setup grows with the data pin transition and shrinks with the clock
+#     transition, hold the other way round
+#   - short circuit current adds up to 10% internal power at max_slew
+#
+# The cacti numbers are the values at the smallest slew and load.
 ################################################################################
 
+NLDM_SLEW_SENSITIVITY = 0.2
+NLDM_SHORT_CIRCUIT    = 0.1
+
+# nldm_indicies: n table indicies from lo to hi, geometrically spaced so the
+# small values the tools see most often get the most points.
+def nldm_indicies( lo, hi, n ):
+    return [lo] + [lo * (hi / lo) ** (i / (n - 1)) for i in range(1, n - 1)] + [hi]
+
+# nldm_table_1d / nldm_table_2d: the values of a table over the indicies, as
+# the text between the quotes of values ( ... ).
+def nldm_table_1d( f, index_1 ):
+    return ', '.join('%.3f' % f(a) for a in index_1)
+
+def nldm_table_2d( f, index_1, index_2 ):
+    return ', \\\n'.join('                  "%s"' % nldm_table_1d(lambda b: f(a, b), index_2) for a in index_1)
+
+# nldm_tables: the table indicies and values of the cell, keyed like the
+# fragments above use them.
+def nldm_tables( n, tcq, tsetup, thold, clkpindynamic, pindynamic, fo4, min_slew, max_slew, min_load, max_load ):
+    slews = nldm_indicies( min_slew, max_slew, n )
+    loads = nldm_indicies( min_load, max_load, n )
+    if n == 2:
+        delay      = lambda s, l: tcq
+        setup      = lambda c, d: tsetup
+        hold       = lambda c, d: thold
+        out_slew   = lambda l: min_slew + (max_slew - min_slew) * (l - min_load) / (max_load - min_load)
+        clk_energy = lambda s: clkpindynamic
+        pin_energy = lambda s: pindynamic
+    else:
+        k          = NLDM_SLEW_SENSITIVITY
+        r_out      = fo4 / (math.log(2) * max_load)
+        short      = lambda s: 1 + NLDM_SHORT_CIRCUIT * (s - min_slew) / (max_slew - min_slew)
+        delay      = lambda s, l: tcq + k * (s - min_slew) + math.log(2) * r_out * (l - min_load)
+        setup      = lambda c, d: tsetup + k * (d - c)
+        hold       = lambda c, d: thold + k * (c - d)
+        out_slew   = lambda l: min_slew + math.log(4) * r_out * (l - min_load)
+        clk_energy = lambda s: clkpindynamic * short(s)
+        pin_energy = lambda s: pindynamic * short(s)
+    return { 'template_indicies'   : ', '.join('%d' % (1000 + i) for i in range(n))
+           , 'slew_indicies'       : ', '.join('%.3f' % s for s in slews)
+           , 'load_indicies'       : ', '.join('%.3f' % l for l in loads)
+           , 'tcq_table'           : nldm_table_2d( delay, slews, loads )
+           , 'tsetup_table'        : nldm_table_2d( setup, slews, slews )
+           , 'thold_table'         : nldm_table_2d( hold, slews, slews )
+           , 'out_slew_table'      : nldm_table_1d( out_slew, loads )
+           , 'clkpindynamic_table' : nldm_table_1d( clk_energy, slews )
+           , 'pindynamic_table'    : nldm_table_1d( pin_energy, slews ) }
+
+# lib_timestamp: the date and time stamped into the libraries, now unless
+# SOURCE_DATE_EPOCH (seconds since 1970-01-01 UTC) fixes it, so the same inputs
+# give byte-identical libraries.
+def lib_timestamp():
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if not epoch:
+        return datetime.date.today().isoformat(), time.strftime("%H:%M:%SZ", time.gmtime())
+    try:
+        t = time.gmtime(int(epoch))
+    except ValueError:
+        raise Exception("SOURCE_DATE_EPOCH must be an integer number of seconds, got '{}'".format(epoch))
+    return time.strftime("%Y-%m-%d", t), time.strftime("%H:%M:%SZ", t)
+
+# The operating conditions of the nominal library
+NOMINAL_CORNER = { 'name' : 'tt_1.0_25.0', 'process' : 1.0, 'temperature' : 25.0 }
+
+# generate_lib: write <name>.lib for the nominal corner and <name>_<corner>.lib
+# for every extra operating corner of the process (see mem.corners). Returns
+# the paths of the libraries.
 def generate_lib( mem ):
+    paths = []
+    for corner in [None] + mem.corners:
+        header, cell = render_lib( mem, corner=corner )
+        suffix = '_' + corner['name'] if corner else ''
+        paths.append(os.sep.join([mem.results_dir, mem.name + suffix + '.lib']))
+        write_if_changed(paths[-1], header + cell + LIB_FOOTER)
+    return paths
+
+# render_lib: the library header and the cell (with its bus types) of the
+# memory as two strings. The header is for a library called `library` (the
+# memory by default, <memory>_<corner> for a corner) and the cell refers to
+# the table templates of that library, so cells rendered for the same library
+# can share one header. The timing and power are those of `corner`, one of
+# mem.corners, or of the nominal corner when it is None.
+def render_lib( mem, library = None, corner = None ):
+
+    library = str(library if library else mem.name + ('_' + corner['name'] if corner else ''))
+    conditions = corner if corner else dict(NOMINAL_CORNER, voltage=float(mem.process.voltage))
+    timing = corner if corner else vars(mem)
 
     # Make sure the data types are correct
     name              = str(mem.name)
@@ -18,19 +417,19 @@ def generate_lib( mem ):
     area              = float(mem.area_um2)
     x                 = float(mem.width_um)
     y                 = float(mem.height_um)
-    leakage           = float(mem.standby_leakage_per_bank_mW)*1e3
+    leakage           = float(timing['standby_leakage_per_bank_mW'])*1e3
     tsetup            = float(mem.t_setup_ns)
     thold             = float(mem.t_hold_ns)
-    tcq               = float(mem.access_time_ns)
-    clkpindynamic     = float(mem.pin_dynamic_power_mW)*1e3
-    pindynamic        = float(mem.pin_dynamic_power_mW)*1e1
+    tcq               = float(timing['access_time_ns'])
+    clkpindynamic     = float(timing['pin_dynamic_power_mW'])*1e3
+    pindynamic        = float(timing['pin_dynamic_power_mW'])*1e1
     min_driver_in_cap = float(mem.cap_input_pf)
-    voltage           = float(mem.process.voltage)
-    min_period        = float(mem.cycle_time_ns)
-    fo4               = float(mem.fo4_ps)/1e3
+    voltage           = float(conditions['voltage'])
+    min_period        = float(timing['cycle_time_ns'])
+    fo4               = float(timing['fo4_ps'])/1e3
 
     # Only support 1RW srams. At some point, expose these as well!
-    
+
     num_rwport                = int(mem.rw_ports)
     num_rport                 = int(mem.r_ports)
     num_wport                 = int(mem.w_ports)
@@ -40,1032 +439,164 @@ def generate_lib( mem ):
     # Number of bits for address
     addr_width        = math.ceil(math.log2(mem.depth))
     addr_width_m1     = addr_width-1
+    # One write mask bit per write_granularity bits
+    wmask_width       = math.ceil(bits / int(mem.write_granularity))
 
     # Get the date
-    d = datetime.date.today()
-    date = d.isoformat()
-    current_time = time.strftime("%H:%M:%SZ", time.gmtime())
+    date, current_time = lib_timestamp()
 
-    # TODO: Arbitrary indicies for the NLDM table. This is used for Clk->Q arcs
-    # as well as setup/hold times. We only have a single value for these, there
-    # are two options. 1. adding some sort of static variation of the single
-    # value for each table entry, 2. use the same value so all interpolated
-    # values are the same. The 1st is more realistic but depend on good variation
-    # values which is process sepcific and I don't have a strategy for
-    # determining decent variation values without breaking NDA so right now we
-    # have no variations.
-    #
     # The table indicies are main min/max values for interpolation. The tools
     # typically don't like extrapolation so a large range is nice, but makes the
-    # single value strategy described above even more unrealistic.
+    # flat single value tables (see NLDM TABLES above) even more unrealistic.
     #
     min_slew = 1   * fo4               ;# arbitrary (1x fo4, fear that 0 would cause issues)
     max_slew = 25  * fo4               ;# arbitrary (25x fo4 as ~100x fanout ... i know that is not really how it works)
     min_load = 1   * min_driver_in_cap ;# arbitrary (1x driver, fear that 0 would cause issues)
     max_load = 100 * min_driver_in_cap ;# arbitrary (100x driver)
 
-    slew_indicies = '%.3f, %.3f' % (min_slew, max_slew) ;# input pin transisiton with between 1xfo4 and 100xfo4
-    load_indicies = '%.3f, %.3f' % (min_load, max_load) ;# output capacitance table between a 1x and 32x inverter
-
-    # Start generating the LIB file
-
-    LIB_file = open(os.sep.join([mem.results_dir, name + '.lib']), 'w')
-
-    LIB_file.write( 'library(%s) {\n' % name)
-    LIB_file.write( '    technology (cmos);\n')
-    LIB_file.write( '    delay_model : table_lookup;\n')
-    LIB_file.write( '    revision : 1.0;\n')
-    LIB_file.write( '    date : "%s %s";\n' % (date, current_time))
-    LIB_file.write( '    comment : "SRAM";\n')
-    LIB_file.write( '    time_unit : "1ns";\n')
-    LIB_file.write( '    voltage_unit : "1V";\n')
-    LIB_file.write( '    current_unit : "1uA";\n')
-    LIB_file.write( '    leakage_power_unit : "1uW";\n')
-    LIB_file.write( '    nom_process : 1;\n')
-    LIB_file.write( '    nom_temperature : 25.000;\n')
-    LIB_file.write( '    nom_voltage : %s;\n' % voltage)
-    LIB_file.write( '    capacitive_load_unit (1,pf);\n\n')
-    LIB_file.write( '    pulling_resistance_unit : "1kohm";\n\n')
-    LIB_file.write( '    operating_conditions(tt_1.0_25.0) {\n')
-    LIB_file.write( '        process : 1;\n')
-    LIB_file.write( '        temperature : 25.000;\n')
-    LIB_file.write( '        voltage : %s;\n' % voltage)
-    LIB_file.write( '        tree_type : balanced_tree;\n')
-    LIB_file.write( '    }\n')
-    LIB_file.write( '\n')
-
-    LIB_file.write( '    /* default attributes */\n')
-    LIB_file.write( '    default_cell_leakage_power : 0;\n')
-    LIB_file.write( '    default_fanout_load : 1;\n')
-    LIB_file.write( '    default_inout_pin_cap : 0.0;\n')
-    LIB_file.write( '    default_input_pin_cap : 0.0;\n')
-    LIB_file.write( '    default_output_pin_cap : 0.0;\n')
-    LIB_file.write( '    default_input_pin_cap : 0.0;\n')
-    LIB_file.write( '    default_max_transition : %.3f;\n\n' % max_slew)
-    LIB_file.write( '    default_operating_conditions : tt_1.0_25.0;\n')
-    LIB_file.write( '    default_leakage_power_density : 0.0;\n')
-    LIB_file.write( '\n')
-
-    LIB_file.write( '    /* additional header data */\n')
-    LIB_file.write( '    slew_derate_from_library : 1.000;\n')
-    LIB_file.write( '    slew_lower_threshold_pct_fall : 20.000;\n')
-    LIB_file.write( '    slew_upper_threshold_pct_fall : 80.000;\n')
-    LIB_file.write( '    slew_lower_threshold_pct_rise : 20.000;\n')
-    LIB_file.write( '    slew_upper_threshold_pct_rise : 80.000;\n')
-    LIB_file.write( '    input_threshold_pct_fall : 50.000;\n')
-    LIB_file.write( '    input_threshold_pct_rise : 50.000;\n')
-    LIB_file.write( '    output_threshold_pct_fall : 50.000;\n')
-    LIB_file.write( '    output_threshold_pct_rise : 50.000;\n\n')
-    LIB_file.write( '\n')
-
-
-    LIB_file.write( '    lu_table_template(%s_mem_out_delay_template) {\n' % name )
-    LIB_file.write( '        variable_1 : input_net_transition;\n')
-    LIB_file.write( '        variable_2 : total_output_net_capacitance;\n')
-    LIB_file.write( '            index_1 ("1000, 1001");\n')
-    LIB_file.write( '            index_2 ("1000, 1001");\n')
-    LIB_file.write( '    }\n')
-    LIB_file.write( '    lu_table_template(%s_mem_out_slew_template) {\n' % name )
-    LIB_file.write( '        variable_1 : total_output_net_capacitance;\n')
-    LIB_file.write( '            index_1 ("1000, 1001");\n')
-    LIB_file.write( '    }\n')
-    LIB_file.write( '    lu_table_template(%s_constraint_template) {\n' % name )
-    LIB_file.write( '        variable_1 : related_pin_transition;\n')
-    LIB_file.write( '        variable_2 : constrained_pin_transition;\n')
-    LIB_file.write( '            index_1 ("1000, 1001");\n')
-    LIB_file.write( '            index_2 ("1000, 1001");\n')
-    LIB_file.write( '    }\n')
-    LIB_file.write( '    power_lut_template(%s_energy_template_clkslew) {\n' % name )
-    LIB_file.write( '        variable_1 : input_transition_time;\n')
-    LIB_file.write( '            index_1 ("1000, 1001");\n')
-    LIB_file.write( '    }\n')
-    LIB_file.write( '    power_lut_template(%s_energy_template_sigslew) {\n' % name )
-    LIB_file.write( '        variable_1 : input_transition_time;\n')
-    LIB_file.write( '            index_1 ("1000, 1001");\n')
-    LIB_file.write( '    }\n')
-    LIB_file.write( '    library_features(report_delay_calculation);\n')
-    LIB_file.write( '    type (%s_DATA) {\n' % name )
-    LIB_file.write( '        base_type : array ;\n')
-    LIB_file.write( '        data_type : bit ;\n')
-    LIB_file.write( '        bit_width : %d;\n' % bits)
-    LIB_file.write( '        bit_from : %d;\n' % (int(bits)-1))
-    LIB_file.write( '        bit_to : 0 ;\n')
-    LIB_file.write( '        downto : true ;\n')
-    LIB_file.write( '    }\n')
-    LIB_file.write( '    type (%s_ADDRESS) {\n' % name)
-    LIB_file.write( '        base_type : array ;\n')
-    LIB_file.write( '        data_type : bit ;\n')
-    LIB_file.write( '        bit_width : %d;\n' % addr_width)
-    LIB_file.write( '        bit_from : %d;\n' % addr_width_m1)
-    LIB_file.write( '        bit_to : 0 ;\n')
-    LIB_file.write( '        downto : true ;\n')
-    LIB_file.write( '    }\n')
-    if mem.has_wmask: 
-        LIB_file.write( '    type (%s_WMASK) {\n' % name)
-        LIB_file.write( '        base_type : array ;\n')
-        LIB_file.write( '        data_type : bit ;\n')
-        LIB_file.write( '        bit_width : %d;\n' % (max(1, bits // 8)))
-        LIB_file.write( '        bit_from : %d;\n' % (max(1, bits // 8)-1))
-        LIB_file.write( '        bit_to : 0 ;\n')
-        LIB_file.write( '        downto : true ;\n')
-        LIB_file.write( '    }\n')
-
-    LIB_file.write( 'cell(%s) {\n' % name )
-    LIB_file.write( '    area : %.3f;\n' % area)
-    #LIB_file.write( '    dont_use : true;\n')
-    #LIB_file.write( '    dont_touch : true;\n')
-    LIB_file.write( '    interface_timing : true;\n')
-    LIB_file.write( '    memory() {\n')
-    LIB_file.write( '        type : ram;\n')
-    LIB_file.write( '        address_width : %d;\n' % addr_width)
-    LIB_file.write( '        word_width : %d;\n' % bits)
-    LIB_file.write( '    }\n')
-
-    for i in range(int(num_rport)):
-      LIB_file.write('    pin(r%s_clk)   {\n' % (i))
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap*5)) ;# Clk pin is usually higher cap for fanout control, assuming an x5 driver.
-      LIB_file.write('        clock : true;\n')
-      LIB_file.write('        min_period           : %.3f ;\n' % (min_period))
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_clkslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (clkpindynamic, clkpindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_clkslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (clkpindynamic, clkpindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-      LIB_file.write('\n')
+    # Input pin transisiton between 1xfo4 and 25xfo4, output capacitance
+    # between a 1x and 100x driver
+    tables = nldm_tables( int(mem.process.nldm_table_size), tcq, tsetup, thold, clkpindynamic, pindynamic
+                        , fo4, min_slew, max_slew, min_load, max_load )
+
+    # Record the substitute shape cacti characterized this sram as, in the
+    # library comment or in front of the cell in a merged library
+    comment = 'SRAM'
+    cell_comment = ''
+    if mem.cacti_width_in_bits != bits or mem.cacti_depth != depth:
+        if library == name:
+            comment = 'SRAM, characterized by cacti as %dx%d' % (mem.cacti_width_in_bits, mem.cacti_depth)
+        else:
+            cell_comment = '    /* %s characterized by cacti as %dx%d */\n' % (name, mem.cacti_width_in_bits, mem.cacti_depth)
+
+    values = { 'library'           : library
+             , 'templates'         : library
+             , 'name'              : name
+             , 'date'              : date
+             , 'current_time'      : current_time
+             , 'comment'           : comment
+             , 'conditions'        : conditions['name']
+             , 'process'           : '%g' % conditions['process']
+             , 'temperature'       : '%.3f' % conditions['temperature']
+             , 'voltage'           : '%s' % voltage
+             , 'bits'              : '%d' % bits
+             , 'bits_m1'           : '%d' % (bits-1)
+             , 'addr_width'        : '%d' % addr_width
+             , 'addr_width_m1'     : '%d' % addr_width_m1
+             , 'wmask_width'       : '%d' % wmask_width
+             , 'wmask_width_m1'    : '%d' % (wmask_width-1)
+             , 'area'              : '%.3f' % area
+             , 'leakage'           : '%.3f' % leakage
+             , 'tsetup'            : '%.3f' % tsetup
+             , 'thold'             : '%.3f' % thold
+             , 'tcq'               : '%.3f' % tcq
+             , 'clkpindynamic'     : '%.3f' % clkpindynamic
+             , 'pindynamic'        : '%.3f' % pindynamic
+             , 'min_driver_in_cap' : '%.3f' % min_driver_in_cap
+             # Clk pin is usually higher cap for fanout control, assuming an x5 driver.
+             , 'clk_cap'           : '%.3f' % (min_driver_in_cap*5)
+             , 'min_period'        : '%.3f' % min_period
+             , 'min_slew'          : '%.3f' % min_slew
+             , 'max_slew'          : '%.3f' % max_slew
+             # Based on 32x inverter being a common max (or near max) inverter
+             , 'max_load'          : '%.3f' % max_load }
+    # NLDM table indicies and values
+    values.update(tables)
+
+    ports = { 'r'  : [ {'port' : 'r%d' % i} for i in range(num_rport) ]
+            , 'w'  : [ {'port' : 'w%d' % i} for i in range(num_wport) ]
+            , 'rw' : [ {'port' : 'rw%d' % i} for i in range(num_rwport) ] }
+
+    # Render the LIB file
+
+    chunks = [cell_comment, LIB_TYPES % values]
+    if mem.has_wmask:
+        chunks.append(LIB_WMASK_TYPE % values)
+    chunks.append(LIB_CELL % values)
+    for block, kinds, needs_wmask in LIB_PORT_BLOCKS:
+        if needs_wmask and not mem.has_wmask:
+            continue
+        block = block % values
+        for kind in kinds:
+            chunks.extend(block % port for port in ports[kind])
+    chunks.append(LIB_CELL_FOOTER % values)
+
+    return LIB_HEADER % values, ''.join(chunks)
 
-    for i in range(int(num_wport)):
-      LIB_file.write('    pin(w%s_clk)   {\n' % (i))
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap*5)) ;# Clk pin is usually higher cap for fanout control, assuming an x5 driver.
-      LIB_file.write('        clock : true;\n')
-      LIB_file.write('        min_period           : %.3f ;\n' % (min_period))
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_clkslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (clkpindynamic, clkpindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_clkslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (clkpindynamic, clkpindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-      LIB_file.write('\n')
-
-    for i in range(int(num_rwport)):
-      LIB_file.write('    pin(rw%s_clk)   {\n' % (i))
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap*5)) ;# Clk pin is usually higher cap for fanout control, assuming an x5 driver.
-      LIB_file.write('        clock : true;\n')
-      LIB_file.write('        min_period           : %.3f ;\n' % (min_period))
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_clkslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (clkpindynamic, clkpindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_clkslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (clkpindynamic, clkpindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-      LIB_file.write('\n')
-
-    for i in range(int(num_rwport)) :
-      LIB_file.write('    bus(rw%s_rd_out)   {\n' % (i))
-      LIB_file.write('        bus_type : %s_DATA;\n' % name)
-      LIB_file.write('        direction : output;\n')
-      LIB_file.write('        max_capacitance : %.3f;\n' % max_load) ;# Based on 32x inverter being a common max (or near max) inverter
-      LIB_file.write('        memory_read() {\n')
-      LIB_file.write('            address : r%s_addr_in;\n' % (i))
-      LIB_file.write('        }\n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : "rw%s_clk" ;\n' % (i))
-      LIB_file.write('            timing_type : rising_edge;\n')
-      LIB_file.write('            timing_sense : non_unate;\n')
-      LIB_file.write('            cell_rise(%s_mem_out_delay_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % load_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tcq, tcq))
-      LIB_file.write('                  "%.3f, %.3f" \\\n' % (tcq, tcq))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            cell_fall(%s_mem_out_delay_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % load_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tcq, tcq))
-      LIB_file.write('                  "%.3f, %.3f" \\\n' % (tcq, tcq))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            rise_transition(%s_mem_out_slew_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % load_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (min_slew, max_slew))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_transition(%s_mem_out_slew_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % load_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (min_slew, max_slew))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-    
-    for i in range(int(num_rport)) :
-      LIB_file.write('    bus(r%s_rd_out)   {\n' % (i))
-      LIB_file.write('        bus_type : %s_DATA;\n' % name)
-      LIB_file.write('        direction : output;\n')
-      LIB_file.write('        max_capacitance : %.3f;\n' % max_load) ;# Based on 32x inverter being a common max (or near max) inverter
-      LIB_file.write('        memory_read() {\n')
-      LIB_file.write('            address : r%s_addr_in;\n' % (i))
-      LIB_file.write('        }\n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : "r%s_clk" ;\n' % (i))
-      LIB_file.write('            timing_type : rising_edge;\n')
-      LIB_file.write('            timing_sense : non_unate;\n')
-      LIB_file.write('            cell_rise(%s_mem_out_delay_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % load_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tcq, tcq))
-      LIB_file.write('                  "%.3f, %.3f" \\\n' % (tcq, tcq))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            cell_fall(%s_mem_out_delay_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % load_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tcq, tcq))
-      LIB_file.write('                  "%.3f, %.3f" \\\n' % (tcq, tcq))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            rise_transition(%s_mem_out_slew_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % load_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (min_slew, max_slew))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_transition(%s_mem_out_slew_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % load_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (min_slew, max_slew))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-    
-    for i in range(int(num_rwport)) :
-      LIB_file.write('    pin(rw%s_we_in)   {\n' % (i))
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : rw%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : rw%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    for i in range(int(num_wport)) :
-      LIB_file.write('    pin(w%s_we_in)   {\n' % (i))
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : w%s_clk;\n'% (i))
-      LIB_file.write('            timing_type : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : w%s_clk;\n'% (i))
-      LIB_file.write('            timing_type : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    for i in range(int(num_rwport)) :
-      LIB_file.write('    pin(rw%s_ce_in)   {\n' % (i))
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : rw%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : rw%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    for i in range(int(num_rport)) :
-      LIB_file.write('    pin(r%s_ce_in)   {\n' % (i))
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : r%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : r%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    for i in range(int(num_wport)) :
-      LIB_file.write('    pin(w%s_ce_in)   {\n' % (i))
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : w%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : w%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    for i in range(int(num_rwport)) :
-      LIB_file.write('    bus(rw%s_addr_in)   {\n' % (i))
-      LIB_file.write('        bus_type : %s_ADDRESS;\n' % name)
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : rw%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : rw%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    for i in range(int(num_rwport)) :
-      LIB_file.write('    bus(rw%s_wd_in)   {\n' % (i))
-      LIB_file.write('        bus_type : %s_DATA;\n' % name)
-      LIB_file.write('        memory_write() {\n')
-      LIB_file.write('            address : rw%s_addr_in;\n' % (i))
-      LIB_file.write('            clocked_on : "rw%s_clk";\n' % (i))
-      LIB_file.write('        }\n')
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin     : rw%s_clk;\n' % (i))
-      LIB_file.write('            timing_type     : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin     : rw%s_clk;\n' % (i))
-      LIB_file.write('            timing_type     : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            when : "(! (rw%s_we_in) )";\n' % (i))
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            when : "(rw%s_we_in)";\n' % (i))
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    for i in range(int(num_wport)) :
-      LIB_file.write('    bus(w%s_wd_in)   {\n' % (i))
-      LIB_file.write('        bus_type : %s_DATA;\n' % name)
-      LIB_file.write('        memory_write() {\n')
-      LIB_file.write('            address : w%s_addr_in;\n' % (i))
-      LIB_file.write('            clocked_on : "w%s_clk";\n' % (i))
-      LIB_file.write('        }\n')
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin     : w%s_clk;\n' % (i))
-      LIB_file.write('            timing_type     : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin     : w%s_clk;\n' % (i))
-      LIB_file.write('            timing_type     : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            when : "(! (w%s_we_in) )";\n' % (i))
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            when : "(w%s_we_in)";\n' % (i))
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    if (mem.has_wmask):
-      for i in range(int(num_rwport)) :
-        LIB_file.write('    bus(rw%s_wmask_in)   {\n' % (i))
-        LIB_file.write('        bus_type : %s_DATA;\n' % name)
-        LIB_file.write('        memory_write() {\n')
-        LIB_file.write('            address : rw%s_addr_in;\n' % (i))
-        LIB_file.write('            clocked_on : "rw%s_clk";\n' % (i))
-        LIB_file.write('        }\n')
-        LIB_file.write('        direction : input;\n')
-        LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-        LIB_file.write('        timing() {\n')
-        LIB_file.write('            related_pin     : rw%s_clk;\n' % (i))
-        LIB_file.write('            timing_type     : setup_rising ;\n')
-        LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ( \\\n')
-        LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-        LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-        LIB_file.write('                )\n')
-        LIB_file.write('            }\n')
-        LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ( \\\n')
-        LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-        LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-        LIB_file.write('                )\n')
-        LIB_file.write('            }\n')
-        LIB_file.write('        } \n')
-        LIB_file.write('        timing() {\n')
-        LIB_file.write('            related_pin     : rw%s_clk;\n' % (i))
-        LIB_file.write('            timing_type     : hold_rising ;\n')
-        LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ( \\\n')
-        LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-        LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-        LIB_file.write('                )\n')
-        LIB_file.write('            }\n')
-        LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ( \\\n')
-        LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-        LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-        LIB_file.write('                )\n')
-        LIB_file.write('            }\n')
-        LIB_file.write('        }\n')
-        LIB_file.write('        internal_power(){\n')
-        LIB_file.write('            when : "(! (rw%s_we_in) )";\n' % (i))
-        LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-        LIB_file.write('            }\n')
-        LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-        LIB_file.write('            }\n')
-        LIB_file.write('        }\n')
-        LIB_file.write('        internal_power(){\n')
-        LIB_file.write('            when : "(rw%s_we_in)";\n' % (i))
-        LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-        LIB_file.write('            }\n')
-        LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-        LIB_file.write('            }\n')
-        LIB_file.write('        }\n')
-        LIB_file.write('    }\n')
-      
-      for i in range(int(num_wport)) :
-        LIB_file.write('    bus(w%s_wmask_in)   {\n' % (i))
-        LIB_file.write('        bus_type : %s_DATA;\n' % name)
-        LIB_file.write('        memory_write() {\n')
-        LIB_file.write('            address : w%s_addr_in;\n' % (i))
-        LIB_file.write('            clocked_on : "w%s_clk";\n' % (i))
-        LIB_file.write('        }\n')
-        LIB_file.write('        direction : input;\n')
-        LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-        LIB_file.write('        timing() {\n')
-        LIB_file.write('            related_pin     : w%s_clk;\n' % (i))
-        LIB_file.write('            timing_type     : setup_rising ;\n')
-        LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ( \\\n')
-        LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-        LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-        LIB_file.write('                )\n')
-        LIB_file.write('            }\n')
-        LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ( \\\n')
-        LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-        LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-        LIB_file.write('                )\n')
-        LIB_file.write('            }\n')
-        LIB_file.write('        } \n')
-        LIB_file.write('        timing() {\n')
-        LIB_file.write('            related_pin     : w%s_clk;\n' % (i))
-        LIB_file.write('            timing_type     : hold_rising ;\n')
-        LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ( \\\n')
-        LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-        LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-        LIB_file.write('                )\n')
-        LIB_file.write('            }\n')
-        LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ( \\\n')
-        LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-        LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-        LIB_file.write('                )\n')
-        LIB_file.write('            }\n')
-        LIB_file.write('        }\n')
-        LIB_file.write('        internal_power(){\n')
-        LIB_file.write('            when : "(! (w%s_we_in) )";\n' % (i))
-        LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-        LIB_file.write('            }\n')
-        LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-        LIB_file.write('            }\n')
-        LIB_file.write('        }\n')
-        LIB_file.write('        internal_power(){\n')
-        LIB_file.write('            when : "(w%s_we_in)";\n' % (i))
-        LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-        LIB_file.write('            }\n')
-        LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-        LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-        LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-        LIB_file.write('            }\n')
-        LIB_file.write('        }\n')
-        LIB_file.write('    }\n')
-
-    for i in range(int(num_rport)) :
-      LIB_file.write('    bus(r%s_addr_in)   {\n' % (i))
-      LIB_file.write('        bus_type : %s_ADDRESS;\n' % name)
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : r%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : r%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-    for i in range(int(num_wport)) :
-      LIB_file.write('    bus(w%s_addr_in)   {\n' % (i))
-      LIB_file.write('        bus_type : %s_ADDRESS;\n' % name)
-      LIB_file.write('        direction : input;\n')
-      LIB_file.write('        capacitance : %.3f;\n' % (min_driver_in_cap))
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : w%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : setup_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (tsetup, tsetup))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (tsetup, tsetup))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        } \n')
-      LIB_file.write('        timing() {\n')
-      LIB_file.write('            related_pin : w%s_clk;\n' % (i))
-      LIB_file.write('            timing_type : hold_rising ;\n')
-      LIB_file.write('            rise_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_constraint(%s_constraint_template) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                index_2 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ( \\\n')
-      LIB_file.write('                  "%.3f, %.3f", \\\n' % (thold, thold))
-      LIB_file.write('                  "%.3f, %.3f" \\\n'  % (thold, thold))
-      LIB_file.write('                )\n')
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('        internal_power(){\n')
-      LIB_file.write('            rise_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('            fall_power(%s_energy_template_sigslew) {\n' % name)
-      LIB_file.write('                index_1 ("%s");\n' % slew_indicies)
-      LIB_file.write('                values ("%.3f, %.3f")\n' % (pindynamic, pindynamic))
-      LIB_file.write('            }\n')
-      LIB_file.write('        }\n')
-      LIB_file.write('    }\n')
-
-
-    LIB_file.write('    cell_leakage_power : %.3f;\n' % (leakage))
-    LIB_file.write('}\n')
-
-    LIB_file.write('\n')
-    LIB_file.write('}\n')
-
-    LIB_file.close()
+################################################################################
+# MERGED LIBERTY VIEW
+#
+# One .lib file holding the cells of many memories. The library header and the
+# table templates appear once (taken from the first memory) and the cells are
+# collected as they are added. Cells keep their own bus types. Given the order
+# of the memories, cells added early are held back until the memories before
+# them are in, so the file does not depend on which memory finished first. The
+# file is written on close, and only if its content changed (so a run where
+# every memory was up to date leaves it untouched). A cell kept from an earlier
+# run comes without a header; if it is the first one, the header of the
+# library written then is reused.
+################################################################################
 
+class MergedLib:
+
+    # Ends the file (after the last cell)
+    FOOTER = LIB_FOOTER
+
+    # Last line of the library header
+    HEADER_END = LIB_HEADER.splitlines(True)[-1]
+
+    def __init__( self, path, library, order = None ):
+        self.path    = path
+        self.library = library
+        self.order   = list(order) if order else []
+        self.pending = {}
+        self.header  = None
+        self.cells   = []
+        self.count   = 0
+
+    # add: collect the cell of memory `name`, given as the (header, cell)
+    # strings render_lib(mem, library) returned for it (header None for a cell
+    # kept from an earlier run).
+    def add( self, name, rendered ):
+        if name not in self.order:
+            self.__write( rendered )
+            return
+        self.pending[name] = rendered
+        while self.order and self.order[0] in self.pending:
+            self.__write( self.pending.pop(self.order.pop(0)) )
+
+    # close: add the cells still held back (the memories before them never
+    # finished), end the library and write it out if it changed.
+    def close( self ):
+        for name in self.order:
+            if name in self.pending:
+                self.__write( self.pending.pop(name) )
+        self.order = []
+        if not self.cells:
+            return
+        if self.header is None:
+            print(f'Cannot write {self.path}: no library header to reuse and no memory was generated, run with --force')
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_if_changed(self.path, self.header + ''.join(self.cells) + self.FOOTER)
+        self.cells = []
+
+    # read_header: the header of the library written by an earlier run, None
+    # if there is none.
+    def read_header( self ):
+        try:
+            with open(self.path, 'r') as fid:
+                text = fid.read()
+        except FileNotFoundError:
+            return None
+        end = text.find(self.HEADER_END)
+        return text[:end + len(self.HEADER_END)] if end >= 0 else None
+
+    def __write( self, rendered ):
+        header, cell = rendered
+        if not self.cells:
+            self.header = header if header else self.read_header()
+        elif self.header is None:
+            self.header = header
+        self.cells.append(cell)
+        self.count += 1
@@ -1,5 +1,7 @@
+import io
 import os
 import math
+from utils.manifest import write_if_changed
 
 ################################################################################
 # GENERATE VERILOG VIEW
@@ -16,13 +18,13 @@ def generate_verilog( mem ):
     num_rport         = mem.r_ports
     num_wport         = mem.w_ports
     num_rwport        = mem.rw_ports
-    num_wmask         = mem.w_ports + mem.rw_ports
-    write_mode        = mem.write_mode
-    has_wmask         = True
     write_granularity = mem.write_granularity
+    num_wmask         = math.ceil(bits / write_granularity)
+    write_mode        = mem.write_mode
+    has_wmask         = mem.has_wmask
     
 
-    V_file = open(os.sep.join([mem.results_dir, name + '.v']), 'w')
+    V_file = io.StringIO()
 
     V_file.write('module %s\n' % name)
     V_file.write('(\n')
@@ -59,11 +61,11 @@ def generate_verilog( mem ):
     # Port Logic
     ########################################
     if num_rport > 0:
-      write_logic( V_file, name, num_rport, write_mode, num_wmask, has_wmask, write_granularity, 'r' )
+      write_logic( V_file, name, bits, num_rport, write_mode, num_wmask, has_wmask, write_granularity, 'r' )
     if num_wport > 0:
-      write_logic( V_file, name, num_wport, write_mode, num_wmask, has_wmask, write_granularity, 'w' )
+      write_logic( V_file, name, bits, num_wport, write_mode, num_wmask, has_wmask, write_granularity, 'w' )
     if num_rwport > 0:
-      write_logic( V_file, name, num_rwport, write_mode, num_wmask, has_wmask, write_granularity, 'rw' )
+      write_logic( V_file, name, bits, num_rwport, write_mode, num_wmask, has_wmask, write_granularity, 'rw' )
     V_file.write('\n')
 
 
@@ -86,7 +88,9 @@ def generate_verilog( mem ):
                  f'\n'
                  f'endmodule\n')
 
-    V_file.close()
+    path = os.sep.join([mem.results_dir, name + '.v'])
+    write_if_changed(path, V_file.getvalue())
+    return path
 
 ################################################################################
 # GENERATE VERILOG BLACKBOX VIEW
@@ -105,13 +109,13 @@ def generate_verilog_bb( mem ):
     num_rport         = mem.r_ports
     num_wport         = mem.w_ports
     num_rwport        = mem.rw_ports
-    num_wmask         = mem.w_ports + mem.rw_ports
-    write_mode        = mem.write_mode
-    has_wmask         = True
     write_granularity = mem.write_granularity
+    num_wmask         = math.ceil(bits / write_granularity)
+    write_mode        = mem.write_mode
+    has_wmask         = mem.has_wmask
 
 
-    V_file = open(os.sep.join([mem.results_dir, name + '.bb.v']), 'w')
+    V_file = io.StringIO()
 
     V_file.write('module %s\n' % name)
     V_file.write('(\n')
@@ -142,7 +146,9 @@ def generate_verilog_bb( mem ):
 
     V_file.write('\n')
     V_file.write('endmodule\n')
-    V_file.close()
+    path = os.sep.join([mem.results_dir, name + '.bb.v'])
+    write_if_changed(path, V_file.getvalue())
+    return path
 
 ########################################
 # Helper functions
@@ -179,7 +185,7 @@ def write_ports( V_file, num_port, num_wmask, has_wmask, type_port) -> None:
         if has_wmask:
           V_file.write(f'   input  [{num_wmask-1}:0]             {type_port}{i}_wmask_in;\n')
 
-def write_logic( V_file, name, num_port, write_mode, num_wmask, has_wmask, write_granularity, type_port):
+def write_logic( V_file, name, bits, num_port, write_mode, num_wmask, has_wmask, write_granularity, type_port):
   for i in range(int(num_port)):
     V_file.write(f'   always @(posedge {type_port}{i}_clk) begin\n'
                  f'      if ({type_port}{i}_ce_in) begin\n')
@@ -205,7 +211,8 @@ def write_logic( V_file, name, num_port, write_mode, num_wmask, has_wmask, write
         if has_wmask:
             for j in range(num_wmask):
               V_file.write(f"            if ({type_port}{i}_wmask_in[{j}])\n")
-              V_file.write(f"               mem[{type_port}{i}_addr_in][{(j+1)*write_granularity-1}:{j*write_granularity}] <= ({type_port}{i}_wd_in[{(j+1)*write_granularity-1}:{j*write_granularity}]);\n")
+              msb = min((j+1)*write_granularity, bits)-1
+              V_file.write(f"               mem[{type_port}{i}_addr_in][{msb}:{j*write_granularity}] <= ({type_port}{i}_wd_in[{msb}:{j*write_granularity}]);\n")
         else:
               V_file.write(f"            mem[{type_port}{i}_addr_in] <= {type_port}{i}_wd_in;\n")
             
@@ -226,7 +233,8 @@ def write_logic( V_file, name, num_port, write_mode, num_wmask, has_wmask, write
     V_file.write(f'\n')
 
 def write_timing_checks( V_file, num_port, has_wmask, type_port) -> None:
-    for i in range(num_port):
+    # Only ports with a read data output have a clk to output path
+    for i in range(num_port if type_port in ('r', 'rw') else 0):
       V_file.write(f'      (posedge {type_port}{i}_clk *> {type_port}{i}_rd_out) = (0, 0);\n')
     # V_file.write('\n')
     # V_file.write('      // Timing checks\n')
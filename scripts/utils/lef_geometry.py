@@ -0,0 +1,140 @@
+import math
+import itertools
+from utils.pin_plan import SIDES
+
+################################################################################
+# LEF GEOMETRY
+#
+# The LEF view of a memory as data: the macro outline, every pin with its layer
+# and rectangles, and the layers that are fully obstructed. build_lef_macro
+# works out all of it in one pass over the pin plan (the layer, pin size and
+# edge of every side are worked out once, not per pin), generate_lef only
+# serializes it.
+################################################################################
+
+# LefPin: one pin of the macro. shapes is a list of (layer, rects) with rects
+# the (x0, y0, x1, y1) rectangles in um on that layer. shape is the LEF SHAPE
+# of the pin (None for no SHAPE line).
+class LefPin:
+
+  def __init__( self, name, direction, use, shapes, shape = None ):
+    self.name      = name
+    self.direction = direction
+    self.use       = use
+    self.shapes    = shapes
+    self.shape     = shape
+
+# LefMacro: the pins of a width_um x height_um macro (signal pins first, then
+# supplies) and the layers obstructed over the whole macro.
+class LefMacro:
+
+  def __init__( self, name, width_um, height_um, pins, obstruction_layers ):
+    self.name               = name
+    self.width_um           = width_um
+    self.height_um          = height_um
+    self.pins               = pins
+    self.obstruction_layers = obstruction_layers
+
+# build_lef_macro: the LEF geometry of a memory.
+def build_lef_macro( mem ):
+  metalPrefix = mem.process.metalPrefix
+  pins = signal_pin_shapes( mem ) + supply_pin_shapes( mem )
+  obstruction_layers = [ '%s%d' % (metalPrefix, layer) for layer in (1, 2, 3, 4) ]
+  if mem.process.tech_nm == 45:
+    obstruction_layers.append('OVERLAP')
+  return LefMacro(mem.name, mem.width_um, mem.height_um, pins, obstruction_layers)
+
+# signal_pin_shapes: the signal pins of the pin plan of a memory. The pins of a
+# side are evenly spaced from the start of the side, so the rectangles of every
+# side are computed together and handed out to its pins in order. Left/right
+# pins are strips of the LR pin size on the pin layer (metal 4, metal 3 if
+# flipPins), top/bottom pins strips of the TB pin size on the layer of the
+# other direction.
+def signal_pin_shapes( mem ):
+  process = mem.process
+  plan    = mem.pin_plan
+  W       = mem.width_um
+  H       = mem.height_um
+  lr_layer = process.metalPrefix + ('3' if process.flipPins.lower() == 'true' else '4')
+  tb_layer = process.metalPrefix + ('2' if lr_layer == process.metalPrefix + '3' else '3')
+  lr_hpw, lr_ph = process.LRwidth_um / 2.0, process.LRheight_um
+  tb_hpw, tb_ph = process.TBwidth_um / 2.0, process.TBheight_um
+  layers = { 'L' : lr_layer, 'R' : lr_layer, 'T' : tb_layer, 'B' : tb_layer }
+
+  counts = { side : 0 for side in SIDES }
+  for pin in plan.pins:
+    counts[pin.side] += 1
+  rects = {}
+  for side in SIDES:
+    # Pin centers along the side (accumulated like a cursor stepping by the pitch)
+    cs = list(itertools.accumulate([plan[side].start_um] + [plan[side].pitch_um] * (counts[side] - 1))) if counts[side] else []
+    if side == 'L':    # vertical strips at left edge
+      rects[side] = iter([ (0.0, c - lr_hpw, lr_ph, c + lr_hpw) for c in cs ])
+    elif side == 'R':  # vertical strips at right edge
+      rects[side] = iter([ (W - lr_ph, c - lr_hpw, W, c + lr_hpw) for c in cs ])
+    elif side == 'T':  # horizontal strips at top edge
+      rects[side] = iter([ (c - tb_hpw, H - tb_ph, c + tb_hpw, H) for c in cs ])
+    else:              # horizontal strips at bottom edge
+      rects[side] = iter([ (c - tb_hpw, 0.0, c + tb_hpw, tb_ph) for c in cs ])
+
+  return [ LefPin(pin.name, 'INPUT' if pin.is_input else 'OUTPUT', 'SIGNAL', [(layers[pin.side], [next(rects[pin.side])])], 'ABUTMENT') for pin in plan.pins ]
+
+# supply_pin_shapes: the VSS and VDD pins, straps across the macro on every
+# layer of the process power_straps (see class_process). On a layer the straps
+# alternate VSS, VDD, VSS, ... pitch apart, starting offset from the edge (6 pin
+# pitches by default) and running the length of the macro but for the same
+# keep-out at both ends. With max_straps, a layer that would get more straps
+# than that uses a multiple of its pitch instead, the smallest that fits.
+def supply_pin_shapes( mem ):
+  vss = []
+  vdd = []
+  for straps in mem.process.power_straps:
+    vss_rects, vdd_rects = power_strap_rects( mem, straps )
+    vss.append((straps['layer'], vss_rects))
+    vdd.append((straps['layer'], vdd_rects))
+  return [ LefPin('VSS', 'INOUT', 'GROUND', vss)
+         , LefPin('VDD', 'INOUT', 'POWER', vdd) ]
+
+# power_strap_rects: the VSS and VDD rectangles of one layer of straps.
+def power_strap_rects( mem, straps ):
+  process = mem.process
+  w = mem.width_um
+  h = mem.height_um
+  half_width = straps['width_um']/2
+  vertical = straps['direction'] == 'vertical'
+  ps_x_offset = 6 * process.TBpitch_um
+  ps_y_offset = 6 * process.LRpitch_um
+  if vertical:
+    first = ps_x_offset if straps['offset_um'] is None else straps['offset_um']
+    last  = w - process.TBpitch_um
+  else:
+    first = ps_y_offset if straps['offset_um'] is None else straps['offset_um']
+    last  = h - process.LRpitch_um
+
+  # Strap centers of one net, stepping from start by step
+  def centers( start, step ):
+    cs = []
+    c = start
+    while c <= last:
+      cs.append(c)
+      c += step
+    return cs
+
+  pitch = straps['pitch_um']
+  if straps['max_straps'] is not None and first <= last:
+    scale = max(1, math.ceil((math.floor((last - first) / pitch) + 1) / straps['max_straps']))
+    while len(centers(first, pitch*scale*2)) + len(centers(first + pitch*scale, pitch*scale*2)) > straps['max_straps']:
+      scale += 1
+    pitch = pitch*scale
+
+  if vertical:
+    rect = lambda c: (c-half_width, ps_y_offset, c+half_width, h-ps_y_offset)
+  else:
+    rect = lambda c: (ps_x_offset, c-half_width, w-ps_x_offset, c+half_width)
+  # VDD is interleaved with the VSS straps
+  vss = [ rect(c) for c in centers(first, pitch*2) ]
+  vdd = [ rect(c) for c in centers(first + pitch, pitch*2) ]
+  if not vss or not vdd:
+    raise Exception(f'{mem.name} ({w:.3f} x {h:.3f}): no room for a VSS and a VDD strap on {straps["layer"]}'
+                    + f' (offset {first:.3f}um, pitch {pitch:.3f}um); lower power_straps offset_nm or pitch_nm')
+  return vss, vdd
@@ -0,0 +1,85 @@
+import os
+import json
+import hashlib
+
+################################################################################
+# MANIFEST
+#
+# Incremental regeneration. Every results directory gets a manifest with a
+# fingerprint of everything the views of its sram are generated from (the sram
+# entry, the process part of the configuration, the generator code, the Cacti
+# binary and the command line options that change the views) and a hash of
+# every file written. An sram whose fingerprint matches its manifest and whose
+# files are unchanged on disk is skipped entirely, Cacti included.
+#
+# Views are written with write_if_changed, so regenerating an sram only
+# touches the files whose content actually changed.
+################################################################################
+
+MANIFEST_NAME = '.manifest.json'
+
+# write_if_changed: write text to path unless the file already holds exactly
+# that text. Returns True if the file was written.
+def write_if_changed( path, text ):
+  try:
+    with open( path, 'r' ) as fid:
+      if fid.read() == text:
+        return False
+  except FileNotFoundError:
+    pass
+  with open( path, 'w' ) as fid:
+    fid.write( text )
+  return True
+
+# generator_version: hash of the generator code (the scripts directory and
+# utils/), so changing the generator regenerates every sram.
+def generator_version():
+  scripts_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  h = hashlib.sha256()
+  for d in (scripts_dir, os.path.join(scripts_dir, 'utils')):
+    for name in sorted(os.listdir(d)):
+      if name.endswith('.py'):
+        h.update(name.encode())
+        h.update(b'\0')
+        with open( os.path.join(d, name), 'rb' ) as fid:
+          h.update(fid.read())
+  return h.hexdigest()
+
+# fingerprint: hash of all the inputs of one sram. Every argument must be json
+# serializable.
+def fingerprint( process_data, sram_data, version, options = None ):
+  text = json.dumps({ 'process' : process_data, 'sram' : sram_data, 'generator' : version, 'options' : options }, sort_keys=True)
+  return hashlib.sha256(text.encode()).hexdigest()
+
+def file_hash( path ):
+  with open( path, 'rb' ) as fid:
+    return hashlib.sha256(fid.read()).hexdigest()
+
+# read_manifest: the manifest of a results directory, None if there is none
+# (or it is unreadable).
+def read_manifest( results_dir ):
+  try:
+    with open( os.sep.join([results_dir, MANIFEST_NAME]), 'r' ) as fid:
+      return json.load(fid)
+  except (FileNotFoundError, ValueError):
+    return None
+
+# up_to_date: the manifest of results_dir if it was written for the inputs
+# with fingerprint fp and none of its files changed since, None otherwise.
+def up_to_date( results_dir, fp ):
+  manifest = read_manifest( results_dir )
+  if manifest is None or manifest.get('fingerprint') != fp:
+    return None
+  for name, digest in manifest.get('files', {}).items():
+    path = os.sep.join([results_dir, name])
+    if not os.path.exists( path ) or file_hash( path ) != digest:
+      return None
+  return manifest
+
+# write_manifest: record the fingerprint of the inputs and the files written
+# for them (paths in results_dir). Anything in extra is stored as well.
+def write_manifest( results_dir, fp, paths, extra = None ):
+  manifest = dict(extra) if extra else {}
+  manifest['fingerprint'] = fp
+  manifest['files'] = { os.path.basename(path) : file_hash( path ) for path in paths }
+  write_if_changed( os.sep.join([results_dir, MANIFEST_NAME]), json.dumps(manifest, indent=2, sort_keys=True) + '\n' )
@@ -0,0 +1,260 @@
+import math
+
+################################################################################
+# PIN PLAN
+#
+# Splits the signal pins of an sram around the four sides of the macro and
+# works out how far apart they are placed. Every side has a number of routing
+# tracks (the pin pitch of the side) between the keep-out offsets at its two
+# ends; the pins of a side are spread over them with the same number of tracks
+# between every two pins, as many as fit:
+#
+#   track_count = (tracks_available - 1) // pins
+#
+# i.e. the largest spacing with pins*track_count < tracks_available (a side with
+# exactly as many pins as tracks gets one track per pin). The plan is plain
+# data so the LEF view, the checks and reports can all use the same numbers.
+#
+# By default the pins go to fixed sides (a quarter of the write data on the left
+# and right, ...) and a side with more pins than tracks fails the sram. With
+# "pin_plan": "auto" in the process an infeasible plan is repaired instead:
+# pins at the end of a full side move to the side with the most spare tracks,
+# and if there are more pins than tracks around the whole macro it first grows
+# (height or width, whichever adds tracks for the least area) by as many snap
+# steps as needed.
+################################################################################
+
+# PinPlanError: the pins of sram name do not fit a width_um x height_um macro.
+# sides lists (side, pins, tracks_available) of every side that is too full.
+class PinPlanError(Exception):
+
+  def __init__( self, name, width_um, height_um, sides, hint = '' ):
+    self.name      = name
+    self.width_um  = width_um
+    self.height_um = height_um
+    self.sides     = sides
+    super().__init__(f'{name} ({width_um:.3f} x {height_um:.3f}): not enough tracks for the pins on the '
+                     + ', '.join(f'{SIDE_NAMES[side]} side ({pins} pins, {tracks} tracks)' for side, pins, tracks in sides)
+                     + (f' ({hint})' if hint else ''))
+
+# Left/right pins are on the LR pitch, top/bottom pins on the TB pitch
+SIDES = ('L', 'R', 'T', 'B')
+SIDE_NAMES = { 'L' : 'left', 'R' : 'right', 'T' : 'top', 'B' : 'bottom' }
+PIN_PLANS = ('fixed', 'auto')
+
+# track_spacing: the number of tracks between two neighbouring pins when pins
+# pins share tracks_available tracks (0 for a side without pins).
+def track_spacing( tracks_available, pins ):
+  if pins == 0:
+    return 0
+  return max(1, (tracks_available - 1) // pins)
+
+# side_pin_counts: the number of signal pins reserved on every side of the
+# macro by the fixed split (an estimate, see signal_pins for the actual pins).
+#   L/R: a quarter of the write data (and write mask) bits each, half the
+#        address bits of every port each
+#   T:   half the read data bits, the rest of the write mask bits and the
+#        clock/control pins of every port
+#   B:   half the read data bits and half the write data bits
+def side_pin_counts( mem ):
+  bits       = int(mem.width_in_bits)
+  num_rwport = mem.rw_ports
+  num_wport  = mem.w_ports
+  num_rport  = mem.r_ports
+  addr_width = int(math.ceil(math.log2(mem.depth)))
+  lr_pins = math.ceil(((num_wport + num_rwport) * (2 if mem.has_wmask else 1) * bits) / 4) + math.ceil((num_rport + num_wport + num_rwport) * addr_width / 2)
+  return { 'L' : lr_pins
+         , 'R' : lr_pins
+         , 'T' : math.ceil((num_rport + num_rwport) * bits / 2) + num_rport * 2 + (num_wport + num_rwport) * 3 + math.ceil(((num_wport + num_rwport) * (1 if mem.has_wmask else 0) * bits) / 2)
+         , 'B' : math.ceil((num_rport + num_rwport) * bits / 2) + math.ceil((num_wport + num_rwport) * bits / 2) }
+
+# Pin: one signal pin and the side of the macro it is on.
+class Pin:
+
+  def __init__( self, name, is_input, side ):
+    self.name     = name
+    self.is_input = is_input
+    self.side     = side
+
+# signal_pins: every signal pin of the memory, in the order they are written to
+# the LEF view, on the side the fixed split puts it.
+def signal_pins( mem ):
+  bits       = int(mem.width_in_bits)
+  num_rwport = mem.rw_ports
+  num_wport  = mem.w_ports
+  num_rport  = mem.r_ports
+  addr_width = int(math.ceil(math.log2(mem.depth)))
+  pins = []
+
+  # bus: the bits of bus name, the first ones on the first side and so on, with
+  # split the bit each side starts at
+  def bus( name, is_input, width, split ):
+    for i in range(width):
+      side = [ side for side, first in split if i >= first ][-1]
+      pins.append(Pin(f'{name}[{i}]', is_input, side))
+
+  if mem.has_wmask:
+    wmask_bits = math.ceil(bits / mem.write_granularity)
+    for port in [ f'rw{ct}' for ct in range(num_rwport) ] + [ f'w{ct}' for ct in range(num_wport) ]:
+      bus(f'{port}_wmask_in', True, wmask_bits, [('L', 0), ('R', math.ceil(wmask_bits/4)), ('T', math.ceil(wmask_bits/2))])
+  for port in [ f'rw{ct}' for ct in range(num_rwport) ] + [ f'w{ct}' for ct in range(num_wport) ]:
+    bus(f'{port}_wd_in', True, bits, [('L', 0), ('R', math.ceil(bits/4)), ('B', math.ceil(bits/2))])
+  for port in [ f'rw{ct}' for ct in range(num_rwport) ] + [ f'r{ct}' for ct in range(num_rport) ]:
+    bus(f'{port}_rd_out', False, bits, [('B', 0), ('T', math.ceil(bits/2))])
+  for port in [ f'rw{ct}' for ct in range(num_rwport) ] + [ f'w{ct}' for ct in range(num_wport) ] + [ f'r{ct}' for ct in range(num_rport) ]:
+    bus(f'{port}_addr_in', True, addr_width, [('L', 0), ('R', math.ceil(addr_width/2))])
+
+  # Clock and control pins
+  for port in [ f'rw{ct}' for ct in range(num_rwport) ] + [ f'w{ct}' for ct in range(num_wport) ]:
+    for pin in ('we_in', 'ce_in', 'clk'):
+      pins.append(Pin(f'{port}_{pin}', True, 'T'))
+  for port in [ f'r{ct}' for ct in range(num_rport) ]:
+    for pin in ('ce_in', 'clk'):
+      pins.append(Pin(f'{port}_{pin}', True, 'T'))
+  return pins
+
+# SidePlan: the pins of one side of the macro. start_um is where the first pin
+# goes (along the side), pitch_um the distance between two pins and
+# group_offset_um the unused length of the side, split in two (the offset that
+# would center the pins on the side).
+class SidePlan:
+
+  def __init__( self, side, pins, tracks_available, track_pitch_um, start_um ):
+    self.side             = side
+    self.pins             = pins
+    self.tracks_available = tracks_available
+    self.track_pitch_um   = track_pitch_um
+    self.track_count      = track_spacing(tracks_available, pins)
+    self.pitch_um         = track_pitch_um * self.track_count
+    self.start_um         = start_um
+    self.spare_tracks     = tracks_available - pins * self.track_count
+    self.group_offset_um  = math.floor(self.spare_tracks / 2) * track_pitch_um
+
+  def fits( self ):
+    return self.pins <= self.tracks_available
+
+  def as_dict( self ):
+    return dict(vars(self))
+
+# PinPlan: the plan of all four sides of one macro (sides maps L/R/T/B to its
+# SidePlan) and its signal pins. width_um/height_um is the size of the macro
+# the plan is for, which the auto plan may have grown; rebalanced is True if
+# any pin was moved off its fixed side.
+class PinPlan:
+
+  def __init__( self, name, width_um, height_um, sides, pins, rebalanced = False ):
+    self.name       = name
+    self.width_um   = width_um
+    self.height_um  = height_um
+    self.sides      = sides
+    self.pins       = pins
+    self.rebalanced = rebalanced
+
+  def __getitem__( self, side ):
+    return self.sides[side]
+
+  def fits( self ):
+    return all(plan.fits() for plan in self.sides.values())
+
+  def as_dict( self ):
+    return { 'name'       : self.name
+           , 'width_um'   : self.width_um
+           , 'height_um'  : self.height_um
+           , 'rebalanced' : self.rebalanced
+           , 'sides'      : { side : plan.as_dict() for side, plan in self.sides.items() }
+           , 'pins'       : [ [pin.name, pin.side] for pin in self.pins ] }
+
+# side_tracks: the number of tracks along the left/right and top/bottom sides
+# of a w x h macro.
+def side_tracks( process, w, h ):
+  y_offset = 6 * process.LRpitch_um # arbitrary offset (looks decent)
+  x_offset = 6 * process.TBpitch_um
+  vertical_tracks   = math.floor((h - 2*y_offset) / process.LRpitch_um)
+  horizontal_tracks = math.floor((w - 2*x_offset) / process.TBpitch_um)
+  return { 'L' : vertical_tracks, 'R' : vertical_tracks, 'T' : horizontal_tracks, 'B' : horizontal_tracks }
+
+def make_plan( mem, w, h, pins, counts, rebalanced = False ):
+  tracks = side_tracks( mem.process, w, h )
+  sides = {}
+  for side in SIDES:
+    if side in ('L', 'R'):
+      sides[side] = SidePlan(side, counts[side], tracks[side], mem.process.LRpitch_um, 6 * mem.process.LRpitch_um)
+    else:
+      sides[side] = SidePlan(side, counts[side], tracks[side], mem.process.TBpitch_um, 6 * mem.process.TBpitch_um)
+  return PinPlan(mem.name, w, h, sides, pins, rebalanced)
+
+def pin_counts( pins ):
+  counts = { side : 0 for side in SIDES }
+  for pin in pins:
+    counts[pin.side] += 1
+  return counts
+
+# rebalance: move pins off the sides with more pins than tracks, the last pins
+# of such a side first, each to the side with the most spare tracks. Returns
+# False if there are more pins than tracks around the macro.
+def rebalance( pins, tracks ):
+  counts = pin_counts( pins )
+  if sum(counts.values()) > sum(tracks.values()):
+    return False
+  for pin in reversed(pins):
+    if counts[pin.side] > tracks[pin.side]:
+      to = max(SIDES, key=lambda side: (tracks[side] - counts[side], -SIDES.index(side)))
+      counts[pin.side] -= 1
+      counts[to] += 1
+      pin.side = to
+  return True
+
+# grown_size: the smallest size (in snap steps of height or width) of a w x h
+# macro with tracks for pin_count pins around it. Grows the height if a track
+# on the left and right costs less area than one on the top and bottom, the
+# width otherwise.
+def grown_size( process, w, h, pin_count ):
+  tracks = side_tracks( process, w, h )
+  missing = math.ceil((pin_count - sum(tracks.values())) / 2)
+  if missing <= 0:
+    return w, h
+  if w * process.LRpitch_um <= h * process.TBpitch_um:
+    snap = process.snapHeight_nm
+    h = h + missing * process.LRpitch_um
+    h = (math.ceil(round(h*1000.0, 6)/snap)*snap)/1000.0
+    while sum(side_tracks( process, w, h ).values()) < pin_count:
+      h = (round(h*1000.0) + snap)/1000.0
+  else:
+    snap = process.snapWidth_nm
+    w = w + missing * process.TBpitch_um
+    w = (math.ceil(round(w*1000.0, 6)/snap)*snap)/1000.0
+    while sum(side_tracks( process, w, h ).values()) < pin_count:
+      w = (round(w*1000.0) + snap)/1000.0
+  return w, h
+
+# too_full: (side, pins, tracks_available) of every side of plan with more
+# pins than tracks.
+def too_full( plan ):
+  return [ (side, plan[side].pins, plan[side].tracks_available) for side in SIDES if not plan[side].fits() ]
+
+# plan_pins: the pin plan of a memory. The fixed split spaces the pins of a
+# side for the larger of the reserved and the actual number of pins. Raises
+# PinPlanError (naming every side that does not fit) if a side has more pins
+# than tracks and the process does not plan pins automatically, or if the
+# automatic plan still does not fit after growing and rebalancing.
+def plan_pins( mem ):
+  w = mem.width_um
+  h = mem.height_um
+  pins = signal_pins( mem )
+  reserved = side_pin_counts( mem )
+  actual = pin_counts( pins )
+  plan = make_plan( mem, w, h, pins, { side : max(reserved[side], actual[side]) for side in SIDES } )
+  if plan.fits():
+    return plan
+
+  # Only the reserved counts may not fit, in which case no pin moves
+  if mem.process.pin_plan == 'auto':
+    w, h = grown_size( mem.process, w, h, len(pins) )
+    sides = [ pin.side for pin in pins ]
+    balanced = rebalance( pins, side_tracks( mem.process, w, h ) )
+    plan = make_plan( mem, w, h, pins, pin_counts( pins ), rebalanced=sides != [ pin.side for pin in pins ] )
+    if not balanced or not plan.fits():
+      raise PinPlanError(mem.name, w, h, too_full( plan ), 'after growing the macro and moving pins')
+    return plan
+
+  raise PinPlanError(mem.name, w, h, too_full( plan ), 'set "pin_plan": "auto" to move pins and grow the macro')
@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import contextlib
+
+################################################################################
+# TIMINGS
+#
+# Machine readable profile of a run, as JSON lines. Every stage of every sram
+# (building the memory, rendering the cacti configuration, running cacti,
+# parsing its csv, retrying substitute shapes, writing each view, ...) appends
+# one line with its wall time:
+#
+#   {"ms": 12.5, "pid": 4242, "sram": "fakeram_32x128_1rw", "stage": "lef"}
+#
+# Lines are appended with a single write to a file opened for appending, so
+# worker processes, threads and the event loop can all record into the same
+# file. Retries of substitute shapes are recorded as "retry" lines with the
+# number of substitutes tried. summarize() adds the totals per stage at the end
+# of the run. Without a path nothing is recorded.
+################################################################################
+
+class Timings:
+
+  def __init__( self, path = None ):
+    self.path = path
+
+  # start: begin a new profile (drops the records of an earlier run).
+  def start( self ):
+    if self.path:
+      os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+      open(self.path, 'w').close()
+
+  def record( self, **fields ):
+    if not self.path:
+      return
+    line = (json.dumps(fields, sort_keys=True) + '\n').encode()
+    fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+      os.write(fd, line)
+    finally:
+      os.close(fd)
+
+  # stage: time the body of the with statement as stage `stage` of sram
+  # `sram`. Extra fields are added to the record, a stage that raises is
+  # recorded with "error": true.
+  @contextlib.contextmanager
+  def stage( self, sram, stage, **fields ):
+    if not self.path:
+      yield
+      return
+    start = time.perf_counter()
+    try:
+      yield
+    except BaseException:
+      fields['error'] = True
+      raise
+    finally:
+      self.record(sram=sram, stage=stage, ms=round(1000 * (time.perf_counter() - start), 3), pid=os.getpid(), **fields)
+
+  # summarize: append the number of records and the total and maximum wall
+  # time of every stage, and a record with the totals of the run (including
+  # the number of substitute shapes cacti was retried with).
+  def summarize( self, **totals ):
+    if not self.path:
+      return
+    stages = {}
+    substitutes = 0
+    with open(self.path, 'r') as fid:
+      for line in fid:
+        entry = json.loads(line)
+        substitutes += entry.get('substitutes', 0)
+        if 'ms' not in entry:
+          continue
+        count, total, longest = stages.get(entry['stage'], (0, 0.0, 0.0))
+        stages[entry['stage']] = (count + 1, total + entry['ms'], max(longest, entry['ms']))
+    for stage, (count, total, longest) in sorted(stages.items()):
+      self.record(stage=stage, summary=True, count=count, total_ms=round(total, 3), max_ms=round(longest, 3))
+    self.record(stage='total', summary=True, substitutes=substitutes, **totals)
@@ -0,0 +1,404 @@
+import os
+import re
+import math
+
+################################################################################
+# VERIFY VIEWS
+#
+# Structural checks of the generated .lib, .lef and .v views of a memory. Each
+# view is streamed line by line through a small parser that only keeps what
+# the checks need (pins, busses, references and pin rectangles), and the
+# result is cross-checked against the Memory object:
+#
+#   - every view has exactly the pins the port configuration asks for, with
+#     the right direction and bus width
+#   - liberty timing arcs, memory_read/memory_write groups and verilog
+#     specify entries only reference pins of the same port that exist
+#   - lef pin rectangles lie inside the macro and do not overlap each other
+#   - the .lib of every extra operating corner passes the same liberty checks
+#     and is characterized at the temperature and voltage of its corner
+#
+# The merged library and LEF (--merged-lib/--merged-lef) are checked as a
+# whole: one library, groups closed, the cells/macros of the memories in order,
+# each with the same pins (and size) as the view of its own memory.
+#
+# This is not a replacement for reading the views into the real tools, but it
+# takes milliseconds per macro instead of minutes.
+################################################################################
+
+# verify_views: list of problems found in the views of the memory (empty if
+# all checks pass).
+def verify_views( mem ):
+  expected = expected_pins( mem )
+  problems  = [ 'lib: ' + p for p in check_lib( mem, expected, parse_lib(view_path(mem, '.lib')) ) ]
+  for corner in mem.corners:
+    view = parse_lib(view_path(mem, '_' + corner['name'] + '.lib'))
+    problems += [ f'lib ({corner["name"]}): ' + p for p in check_lib( mem, expected, view ) + check_lib_corner( corner, view ) ]
+  problems += [ 'lef: ' + p for p in check_lef( mem, expected, parse_lef(view_path(mem, '.lef')) ) ]
+  problems += [ 'v: '   + p for p in check_verilog( mem, expected, parse_verilog(view_path(mem, '.v')) ) ]
+  problems += [ 'bb.v: ' + p for p in check_verilog( mem, expected, parse_verilog(view_path(mem, '.bb.v')), False ) ]
+  return problems
+
+# verify_merged_lib: list of problems found in a merged .lib, given the .lib
+# of every memory it should hold, in order.
+def verify_merged_lib( path, lib_paths ):
+  merged = parse_lib( path )
+  problems = check_merged( merged['libraries'], merged['open_groups'] == 0 )
+  views = [ parse_lib( lib_path ) for lib_path in lib_paths ]
+  problems += check_merged_order( 'cells', merged['cells'], [ view['cell'] for view in views ] )
+  for view in views:
+    pins = merged['cell_pins'].get(view['cell'])
+    if pins is None:
+      continue
+    if pins != view['pins']:
+      problems.append(f'{view["cell"]} has other pins than {view["cell"]}.lib')
+    for name, pin in view['pins'].items():
+      bus_type = pin.get('bus_type')
+      if bus_type is not None and merged['types'].get(bus_type) != view['types'].get(bus_type):
+        problems.append(f'{view["cell"]} bus {name} has bus type {bus_type} of width {merged["types"].get(bus_type)}, expected {view["types"].get(bus_type)}')
+  return problems
+
+# verify_merged_lef: list of problems found in a merged .lef, given the .lef
+# of every memory it should hold, in order.
+def verify_merged_lef( path, lef_paths ):
+  merged = parse_lef( path )
+  problems = check_merged( merged['versions'], merged['end_library'] )
+  views = [ parse_lef( lef_path ) for lef_path in lef_paths ]
+  problems += check_merged_order( 'macros', [ macro['macro'] for macro in merged['macros'] ], [ view['macro'] for view in views ] )
+  macros = { macro['macro'] : macro for macro in merged['macros'] }
+  for view in views:
+    macro = macros.get(view['macro'])
+    if macro is None:
+      continue
+    if macro['size'] != view['size']:
+      problems.append(f'{view["macro"]} has size {macro["size"]}, expected {view["size"]}')
+    if macro['pins'] != view['pins']:
+      problems.append(f'{view["macro"]} has other pins than {view["macro"]}.lef')
+  return problems
+
+# check_merged: a merged file has one header and is closed at the end.
+def check_merged( headers, closed ):
+  problems = []
+  if headers != 1:
+    problems.append(f'{headers} library headers, expected 1')
+  if not closed:
+    problems.append('library is not closed at the end of the file')
+  return problems
+
+def check_merged_order( kind, found, expected ):
+  problems  = [ f'missing {name}' for name in expected if name not in found ]
+  problems += [ f'unexpected {name}' for name in found if name not in expected ]
+  if not problems and found != expected:
+    problems.append(f'{kind} are in the order {", ".join(found)}, expected {", ".join(expected)}')
+  return problems
+
+def view_path( mem, suffix ):
+  return os.sep.join([mem.results_dir, mem.name + suffix])
+
+# expected_pins: pin name -> (direction, bus width or None for a single pin)
+# for the ports of the memory.
+def expected_pins( mem ):
+  addr_width  = math.ceil(math.log2(mem.depth))
+  bits        = int(mem.width_in_bits)
+  wmask_width = math.ceil(bits / mem.write_granularity)
+  pins = {}
+  for kind, count in (('r', mem.r_ports), ('w', mem.w_ports), ('rw', mem.rw_ports)):
+    for i in range(count):
+      port = f'{kind}{i}'
+      pins[f'{port}_clk']     = ('input', None)
+      pins[f'{port}_ce_in']   = ('input', None)
+      pins[f'{port}_addr_in'] = ('input', addr_width)
+      if kind in ('r', 'rw'):
+        pins[f'{port}_rd_out'] = ('output', bits)
+      if kind in ('w', 'rw'):
+        pins[f'{port}_we_in'] = ('input', None)
+        pins[f'{port}_wd_in'] = ('input', bits)
+        if mem.has_wmask:
+          pins[f'{port}_wmask_in'] = ('input', wmask_width)
+  return pins
+
+# port_of: 'rw0_addr_in' -> 'rw0'
+def port_of( pin_name ):
+  return pin_name.split('_')[0]
+
+def check_pin_set( expected, found ):
+  problems  = [ f'missing pin {name}' for name in expected if name not in found ]
+  problems += [ f'unexpected pin {name}' for name in found if name not in expected ]
+  return problems
+
+################################################################################
+# LIBERTY
+################################################################################
+
+LIB_GROUP_RE = re.compile(r'^\s*(\w+)\s*\(\s*"?([^)"]*)"?\s*\)\s*\{')
+LIB_ATTR_RE  = re.compile(r'^\s*(\w+)\s*:\s*"?([^";]*?)"?\s*;')
+
+# parse_lib: the cell name, the library attributes, the bus types (name -> bit
+# width) and the pins and busses of the cell (name -> dict of the attributes
+# the checks use). For a library of several cells, cell and pins are those of
+# the last one, cells lists them all in order and cell_pins has the pins of
+# every cell. libraries counts the library groups, open_groups the groups not
+# closed at the end of the file.
+def parse_lib( path ):
+  view = {'cell': None, 'cells': [], 'cell_pins': {}, 'libraries': 0, 'open_groups': 0, 'library': {}, 'types': {}, 'pins': {}}
+  stack = []
+  with open(path, 'r') as fid:
+    for line in fid:
+      m = LIB_GROUP_RE.match(line)
+      if m:
+        group, arg = m.group(1), m.group(2).strip()
+        stack.append((group, arg))
+        if group == 'library' and len(stack) == 1:
+          view['libraries'] += 1
+        if group == 'cell':
+          view['cell'] = arg
+          view['cells'].append(arg)
+          view['pins'] = view['cell_pins'].setdefault(arg, {})
+        elif group in ('pin', 'bus') and len(stack) == 3:
+          view['pins'][arg] = {'kind': group, 'related_pins': [], 'read_address': [], 'write_address': [], 'clocked_on': []}
+        continue
+      if line.strip().startswith('}'):
+        if stack:
+          stack.pop()
+        continue
+      m = LIB_ATTR_RE.match(line)
+      if not m or not stack:
+        continue
+      attr, value = m.group(1), m.group(2).strip()
+      if len(stack) == 1:
+        view['library'][attr] = value
+      if stack[-1][0] == 'type' and attr == 'bit_width':
+        view['types'][stack[-1][1]] = int(value)
+      if len(stack) < 3 or stack[2][0] not in ('pin', 'bus'):
+        continue
+      pin = view['pins'][stack[2][1]]
+      if len(stack) == 3:
+        pin[attr] = value
+      elif stack[-1][0] == 'timing' and attr == 'related_pin':
+        pin['related_pins'].append(value)
+      elif stack[-1][0] == 'memory_read' and attr == 'address':
+        pin['read_address'].append(value)
+      elif stack[-1][0] == 'memory_write' and attr == 'address':
+        pin['write_address'].append(value)
+      elif stack[-1][0] == 'memory_write' and attr == 'clocked_on':
+        pin['clocked_on'].append(value)
+  view['open_groups'] = len(stack)
+  return view
+
+# check_lib_corner: the operating conditions of a corner .lib.
+def check_lib_corner( corner, view ):
+  problems = []
+  for attr, key in (('nom_temperature', 'temperature'), ('nom_voltage', 'voltage'), ('nom_process', 'process')):
+    try:
+      value = float(view['library'].get(attr))
+    except (TypeError, ValueError):
+      problems.append(f'library has no {attr}')
+      continue
+    if not math.isclose(value, corner[key], abs_tol=1e-3):
+      problems.append(f'{attr} is {value:g}, expected {corner[key]:g}')
+  return problems
+
+def check_lib( mem, expected, view ):
+  problems = []
+  if view['cell'] != mem.name:
+    problems.append(f'cell is named {view["cell"]}, expected {mem.name}')
+  pins = view['pins']
+  problems += check_pin_set( expected, pins )
+  for name, pin in pins.items():
+    if name not in expected:
+      continue
+    direction, width = expected[name]
+    if pin.get('direction') != direction:
+      problems.append(f'{name} has direction {pin.get("direction")}, expected {direction}')
+    if width is None and pin['kind'] != 'pin':
+      problems.append(f'{name} is a bus, expected a single pin')
+    if width is not None:
+      if pin['kind'] != 'bus':
+        problems.append(f'{name} is a single pin, expected a {width} bit bus')
+      elif view['types'].get(pin.get('bus_type')) != width:
+        problems.append(f'{name} has bus type {pin.get("bus_type")} of width {view["types"].get(pin.get("bus_type"))}, expected {width} bits')
+    port = port_of(name)
+    # Every arc is timed to the clock of the own port
+    if name.endswith('_clk'):
+      if pin.get('clock') != 'true':
+        problems.append(f'{name} is not marked as a clock')
+    elif not pin['related_pins']:
+      problems.append(f'{name} has no timing arcs')
+    for related in pin['related_pins']:
+      if related != f'{port}_clk':
+        problems.append(f'{name} is timed to {related}, expected {port}_clk')
+    for address in pin['read_address'] + pin['write_address']:
+      if address != f'{port}_addr_in':
+        problems.append(f'{name} is addressed by {address}, expected {port}_addr_in')
+    for clock in pin['clocked_on']:
+      if clock != f'{port}_clk':
+        problems.append(f'{name} is clocked on {clock}, expected {port}_clk')
+    if name.endswith('_rd_out') and not pin['read_address']:
+      problems.append(f'{name} has no memory_read address')
+    if (name.endswith('_wd_in') or name.endswith('_wmask_in')) and not pin['write_address']:
+      problems.append(f'{name} has no memory_write address')
+  return problems
+
+################################################################################
+# LEF
+################################################################################
+
+# parse_lef: the macro name and size, and the pins of the macro (name ->
+# dict with direction, use and a list of (layer, x0, y0, x1, y1) rectangles).
+# For a library of several macros, macro/size/pins are those of the last one
+# and macros lists the macro, size and pins of all of them in order. versions counts
+# the VERSION statements, end_library is True if the file ends the library.
+def parse_lef( path ):
+  view = {'macro': None, 'size': None, 'pins': {}, 'macros': [], 'versions': 0, 'end_library': False}
+  pin = None
+  layer = None
+  in_obs = False
+  with open(path, 'r') as fid:
+    for line in fid:
+      tokens = line.split()
+      if not tokens:
+        continue
+      if tokens[0] == 'VERSION':
+        view['versions'] += 1
+      elif tokens[0] == 'MACRO':
+        view['macro'] = tokens[1]
+        view['size'] = None
+        view['pins'] = {}
+        view['macros'].append({'macro': tokens[1], 'size': None, 'pins': view['pins']})
+      elif tokens[0] == 'SIZE':
+        view['size'] = (float(tokens[1]), float(tokens[3]))
+        if view['macros']:
+          view['macros'][-1]['size'] = view['size']
+      elif tokens[0] == 'END' and tokens[1:] == ['LIBRARY']:
+        view['end_library'] = True
+      elif tokens[0] == 'PIN':
+        pin = view['pins'].setdefault(tokens[1], {'direction': None, 'use': None, 'rects': []})
+      elif tokens[0] == 'OBS':
+        in_obs = True
+      elif tokens[0] == 'END' and len(tokens) == 1 and in_obs:
+        in_obs = False
+      elif tokens[0] == 'END' and len(tokens) == 2 and pin is not None and tokens[1] in view['pins']:
+        pin = None
+      elif pin is not None and tokens[0] == 'DIRECTION':
+        pin['direction'] = tokens[1].lower()
+      elif pin is not None and tokens[0] == 'USE':
+        pin['use'] = tokens[1].lower()
+      elif tokens[0] == 'LAYER':
+        layer = tokens[1]
+      elif tokens[0] == 'RECT' and pin is not None and not in_obs:
+        pin['rects'].append((layer,) + tuple(float(t) for t in tokens[1:5]))
+  return view
+
+def check_lef( mem, expected, view ):
+  problems = []
+  eps = 1e-6
+  if view['macro'] != mem.name:
+    problems.append(f'macro is named {view["macro"]}, expected {mem.name}')
+  w, h = view['size'] if view['size'] else (0.0, 0.0)
+  if view['size'] is None or abs(w - round(mem.width_um, 3)) > eps or abs(h - round(mem.height_um, 3)) > eps:
+    problems.append(f'macro size is {view["size"]}, expected ({mem.width_um:.3f}, {mem.height_um:.3f})')
+
+  # LEF has one pin per bit of a bus
+  expected_bits = {}
+  for name, (direction, width) in expected.items():
+    for bit in ([name] if width is None else [f'{name}[{i}]' for i in range(width)]):
+      expected_bits[bit] = direction
+  signals = { name : pin for name, pin in view['pins'].items() if pin['use'] not in ('power', 'ground') }
+  problems += check_pin_set( expected_bits, signals )
+  for supply, use in (('VDD', 'power'), ('VSS', 'ground')):
+    if supply not in view['pins'] or view['pins'][supply]['use'] != use:
+      problems.append(f'missing {use} pin {supply}')
+
+  rects = {}
+  for name, pin in view['pins'].items():
+    if name in expected_bits and pin['direction'] != expected_bits[name]:
+      problems.append(f'{name} has direction {pin["direction"]}, expected {expected_bits[name]}')
+    if not pin['rects']:
+      problems.append(f'{name} has no shapes')
+    for layer, x0, y0, x1, y1 in pin['rects']:
+      if x0 < -eps or y0 < -eps or x1 > w + eps or y1 > h + eps:
+        problems.append(f'{name} shape ({x0:.3f} {y0:.3f} {x1:.3f} {y1:.3f}) on {layer} is outside the macro')
+      rects.setdefault(layer, []).append((x0, y0, x1, y1, name))
+
+  # Sweep every layer from left to right, only shapes still open in x can
+  # overlap the next one
+  for layer, shapes in rects.items():
+    shapes.sort()
+    active = []
+    for x0, y0, x1, y1, name in shapes:
+      active = [ s for s in active if s[2] > x0 + eps ]
+      for ax0, ay0, ax1, ay1, aname in active:
+        if aname != name and ay0 < y1 - eps and y0 < ay1 - eps:
+          problems.append(f'{name} overlaps {aname} on {layer}')
+      active.append((x0, y0, x1, y1, name))
+  return problems
+
+################################################################################
+# VERILOG
+################################################################################
+
+V_DECL_RE      = re.compile(r'^\s*(input|output)\s+(?:reg\s+)?(?:\[([^:\]]+):([^\]]+)\]\s*)?(\w+)\s*;')
+V_PARAM_RE     = re.compile(r'^\s*parameter\s+(\w+)\s*=\s*(\d+)\s*;')
+V_PATH_RE      = re.compile(r'\(\s*posedge\s+(\w+)\s*\*>\s*(\w+)\s*\)')
+V_SETUPHOLD_RE = re.compile(r'\$setuphold\s*\(\s*posedge\s+(\w+)\s*,\s*(\w+)\s*,')
+
+# parse_verilog: the module name, the names in the port list, the port
+# declarations (name -> (direction, width or None)) and every pin referenced
+# from the specify block.
+def parse_verilog( path ):
+  view = {'module': None, 'ports': [], 'decls': {}, 'references': []}
+  params = {}
+  in_header = False
+  with open(path, 'r') as fid:
+    for line in fid:
+      stripped = line.strip()
+      if stripped.startswith('module '):
+        view['module'] = stripped.split()[1]
+        in_header = True
+        continue
+      if in_header:
+        if stripped.startswith(');'):
+          in_header = False
+        elif stripped not in ('(', ''):
+          view['ports'] += [ p.strip() for p in stripped.split(',') if p.strip() ]
+        continue
+      m = V_PARAM_RE.match(line)
+      if m:
+        params[m.group(1)] = int(m.group(2))
+        continue
+      m = V_DECL_RE.match(line)
+      if m:
+        width = None
+        if m.group(2) is not None:
+          width = eval_width(m.group(2), params) - eval_width(m.group(3), params) + 1
+        view['decls'][m.group(4)] = (m.group(1), width)
+        continue
+      for m in V_PATH_RE.finditer(line):
+        view['references'] += [m.group(1), m.group(2)]
+      for m in V_SETUPHOLD_RE.finditer(line):
+        view['references'] += [m.group(1), m.group(2)]
+  return view
+
+# eval_width: value of a bus bound like 'ADDR_WIDTH-1' with the parameters of
+# the module.
+def eval_width( expr, params ):
+  expr = re.sub(r'[A-Za-z_]\w*', lambda m: str(params.get(m.group(0), m.group(0))), expr)
+  if not re.fullmatch(r'[\d\s+\-*/()]+', expr):
+    raise Exception(f"Can't evaluate verilog bus bound '{expr}'")
+  return int(eval(expr, {'__builtins__': {}}))
+
+def check_verilog( mem, expected, view, has_specify = True ):
+  problems = []
+  if view['module'] != mem.name:
+    problems.append(f'module is named {view["module"]}, expected {mem.name}')
+  problems += check_pin_set( expected, view['ports'] )
+  problems += [ f'port {name} is not declared' for name in view['ports'] if name not in view['decls'] ]
+  for name, (direction, width) in view['decls'].items():
+    if name in expected and (direction, width) != expected[name]:
+      problems.append(f'{name} is declared as {direction} of width {width}, expected {expected[name][0]} of width {expected[name][1]}')
+  for name in view['references']:
+    if name not in view['decls']:
+      problems.append(f'specify block references undeclared {name}')
+  if has_specify and not view['references']:
+    problems.append('no specify block')
+  return problems
@@ -0,0 +1,44 @@
+import itertools
+import os
+import sys
+import types
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(TOP_DIR, 'scripts'))
+
+import utils.class_memory
+from utils.area import get_macro_dimensions_batch
+from utils.class_memory import Memory
+from utils.class_process import Process
+from utils.config import load_config
+
+################################################################################
+# ASAP7 MACRO DIMENSIONS
+#
+# The batch (NumPy) macro dimensions must be identical to the ones the Memory
+# class computes one sram at a time, banking, port multipliers and snapping
+# included. The pin plan is left out (it may grow a macro to fit its pins,
+# which the batch path does not do).
+################################################################################
+
+def test_batch_matches_memory( tmp_path, monkeypatch ):
+  process = Process(load_config(os.path.join(TOP_DIR, 'example_cfgs', 'asap7.cfg')))
+  monkeypatch.setattr(utils.class_memory, 'plan_pins', lambda mem: types.SimpleNamespace(width_um=mem.width_um, height_um=mem.height_um, rebalanced=False))
+
+  srams = []
+  for width, depth, banks, technique, (r, w, rw), has_wmask in itertools.product(
+      (1, 7, 32, 65, 128), (16, 100, 512, 4096), (1, 2, 3, 4), ('width', 'depth')
+      , ((0, 0, 1), (1, 1, 0), (2, 1, 0), (1, 0, 1), (0, 1, 2)), (True, False)):
+    srams.append({ 'name' : f'sram_{len(srams)}', 'width' : width, 'depth' : depth, 'banks' : banks
+                 , 'banking_technique' : technique, 'ports' : { 'r' : r, 'w' : w, 'rw' : rw }
+                 , 'no_wmask' : 'false' if has_wmask else 'true' })
+
+  height_um, width_um = get_macro_dimensions_batch(process
+      , [s['width'] for s in srams], [s['depth'] for s in srams], [s['banks'] for s in srams]
+      , [s['banking_technique'] for s in srams], [s['ports']['r'] for s in srams]
+      , [s['ports']['w'] for s in srams], [s['ports']['rw'] for s in srams]
+      , [s['no_wmask'] != 'true' for s in srams])
+
+  for i, sram in enumerate(srams):
+    mem = Memory(process, dict(sram), output_dir=str(tmp_path))
+    assert (float(height_um[i]), float(width_um[i])) == (mem.height_um, mem.width_um), sram
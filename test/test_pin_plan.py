@@ -0,0 +1,34 @@
+import os
+import sys
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(TOP_DIR, 'scripts'))
+
+from utils.pin_plan import track_spacing
+
+################################################################################
+# TRACK SPACING
+#
+# The closed form (tracks_available - 1) // pins must give the spacing the
+# original LEF generator found by counting up until the pins no longer left a
+# spare track. That loop gave 0 for a side with exactly as many pins as tracks
+# (and never ended for a side without pins); the closed form gives 1 and 0.
+################################################################################
+
+def count_tracks( tracks_available, pins ):
+  spare_tracks = tracks_available - pins
+  track_count = 1
+  while spare_tracks > 0:
+    track_count += 1
+    spare_tracks = tracks_available - pins * track_count
+  return track_count - 1
+
+def test_track_spacing_matches_loop():
+  for pins in range(1, 80):
+    for tracks_available in range(pins + 1, 1000):
+      assert track_spacing(tracks_available, pins) == count_tracks(tracks_available, pins), (tracks_available, pins)
+
+def test_track_spacing_full_and_empty_sides():
+  for tracks in range(1, 100):
+    assert track_spacing(tracks, tracks) == 1
+    assert track_spacing(tracks, 0) == 0